@@ -0,0 +1,87 @@
+import os
+import re
+import time
+import uuid
+import shutil
+
+UPLOAD_DIR = "uploads"
+RUNS_DIR = os.getenv("RUNS_DIR", os.path.join(UPLOAD_DIR, "runs"))
+RUN_RETENTION_COUNT = int(os.getenv("RUN_RETENTION_COUNT", "50"))
+RUN_RETENTION_HOURS = float(os.getenv("RUN_RETENTION_HOURS", "72"))
+RUN_RETENTION_MB = float(os.getenv("RUN_RETENTION_MB", "2048"))
+# Present while a run is queued or running; garbage collection skips the directory.
+ACTIVE_MARKER = ".active"
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def run_dir(run_id: str):
+    return os.path.join(RUNS_DIR, run_id)
+
+
+def create_run_dir(run_id: str):
+    """Directory for everything one analysis writes: the upload, processed CSV, plots and result JSON.
+
+    The directory is marked active until release_run_dir is called for it.
+    """
+    path = run_dir(run_id)
+    os.makedirs(path, exist_ok=True)
+    open(os.path.join(path, ACTIVE_MARKER), "w").close()
+    return path
+
+
+def release_run_dir(path):
+    try:
+        os.remove(os.path.join(path, ACTIVE_MARKER))
+    except FileNotFoundError:
+        pass
+
+
+def is_active(path, cutoff: float):
+    """True while the run is marked active; a marker older than cutoff was left by a crashed run and is ignored."""
+    try:
+        return os.path.getmtime(os.path.join(path, ACTIVE_MARKER)) >= cutoff
+    except OSError:
+        return False
+
+
+def safe_name(name):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(name))[:100]
+
+
+def image_path(artifact_dir: str, *labels, index):
+    return os.path.join(artifact_dir, f"{'_'.join(safe_name(label) for label in labels)}_vis{index}.png")
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def collect_garbage(keep=(), max_runs: int = RUN_RETENTION_COUNT, max_hours: float = RUN_RETENTION_HOURS, max_mb: float = RUN_RETENTION_MB):
+    """Delete the oldest run directories until the count, age and total size limits all hold.
+
+    Directories in keep and those of queued or running jobs are never deleted.
+    """
+    if not os.path.isdir(RUNS_DIR):
+        return
+    runs = sorted(
+        (os.path.getmtime(path), path)
+        for path in (os.path.join(RUNS_DIR, name) for name in os.listdir(RUNS_DIR))
+        if os.path.isdir(path)
+    )
+    keep = {os.path.abspath(path) for path in keep}
+    sizes = {path: dir_size(path) for _, path in runs}
+    total = sum(sizes.values())
+    count = len(runs)
+    cutoff = time.time() - max_hours * 3600
+
+    for mtime, path in runs:
+        if count <= max_runs and total <= max_mb * 1024 * 1024 and mtime >= cutoff:
+            break
+        if os.path.abspath(path) in keep or is_active(path, cutoff):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= sizes[path]
+        count -= 1
@@ -0,0 +1,315 @@
+"""End-to-end benchmark for CoreAgent.analyse_dataset against the offline LLM backend.
+
+Examples:
+    python benchmark.py --preset quick --output bench.json
+    python benchmark.py --rows 1000 100000 --cols 5 50 --missing 0 0.1 --compare bench.json
+    python benchmark.py --smoke
+
+Each case runs in a fresh process so peak RSS is per case. Stage timings
+come from wrapping the stage entry points; stages can nest (critique and
+bivariate selection run inside the univariate/bivariate stages).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import functools
+import itertools
+import subprocess
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+PRESETS = {
+    "quick": {"rows": [1000, 10000], "cols": [5, 20]},
+    "default": {"rows": [1000, 100000, 1000000], "cols": [5, 50]},
+    "full": {"rows": [1000, 100000, 1000000, 10000000], "cols": [5, 50, 500]},
+}
+DEFAULT_MIX = "continuous=0.4,discrete=0.2,categorical=0.3,binary=0.1"
+COLUMN_KINDS = ("continuous", "discrete", "categorical", "binary")
+QUERY = "Which columns have outliers?"
+SMOKE_CASE = {"rows": 200, "cols": 4, "mix": DEFAULT_MIX, "missing": 0.1}
+
+
+# ---------- synthetic datasets ----------
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, share = part.split("=")
+        if kind not in COLUMN_KINDS:
+            raise ValueError(f"Unknown column kind '{kind}', expected one of {COLUMN_KINDS}")
+        mix[kind] = float(share)
+    total = sum(mix.values())
+    return {kind: share / total for kind, share in mix.items()}
+
+
+def column_kinds(n_cols, mix):
+    """Assign a kind to every column so the counts follow the mix as closely as possible."""
+    counts = {kind: int(n_cols * share) for kind, share in mix.items()}
+    for kind in sorted(mix, key=mix.get, reverse=True)[:n_cols - sum(counts.values())]:
+        counts[kind] += 1
+    return [kind for kind, count in counts.items() for _ in range(count)]
+
+
+def make_column(kind, n_rows, rng):
+    if kind == "continuous":
+        values = rng.normal(50, 10, n_rows)
+        outliers = rng.random(n_rows) < 0.01
+        values[outliers] *= 5
+        return values
+    if kind == "discrete":
+        return rng.poisson(4, n_rows)
+    if kind == "categorical":
+        levels = np.array([f"level_{i}" for i in range(rng.integers(3, 12))], dtype=object)
+        return levels[rng.integers(0, len(levels), n_rows)]
+    return rng.integers(0, 2, n_rows).astype(bool)
+
+
+def make_dataset(n_rows, n_cols, mix, missing=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i, kind in enumerate(column_kinds(n_cols, mix)):
+        column = pd.Series(make_column(kind, n_rows, rng))
+        if missing:
+            column = column.mask(rng.random(n_rows) < missing)
+        data[f"{kind}_{i}"] = column
+    return pd.DataFrame(data)
+
+
+# ---------- stage instrumentation ----------
+
+class StageRecorder:
+    """Accumulates wall time and LLM usage for every call of the wrapped stage functions."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stages = {}
+
+    def add(self, stage, seconds, before, after):
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0, "llm_calls": 0, "prompt_tokens": 0})
+        entry["seconds"] = round(entry["seconds"] + seconds, 4)
+        entry["calls"] += 1
+        entry["llm_calls"] += after["total_calls"] - before["total_calls"]
+        entry["prompt_tokens"] += after["prompt_tokens_estimate"] - before["prompt_tokens_estimate"]
+
+    def wrap(self, owner, attr, stage):
+        original = getattr(owner, attr)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            before = self.backend.stats()
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start, before, self.backend.stats())
+
+        setattr(owner, attr, timed)
+
+
+def peak_rss_mb(who):
+    import resource
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+def run_case(case, options, queue):
+    os.environ["LLM_BACKEND"] = "offline"
+    if options["incremental"]:
+        # A fresh column store per case, so only the repeated runs of this case can reuse results.
+        os.environ["COLUMN_STORE_DIR"] = tempfile.mkdtemp(prefix="bench_column_store_")
+    import resource
+    import llm_client
+    from offline_llm import OfflineLLMBackend
+
+    backend = OfflineLLMBackend(latency=options["latency"])
+    llm_client.set_client(backend)
+
+    import type_detector
+    import core_agent
+    from core_agent import CoreAgent
+    from preprocess_critique import PreprocessorCritique
+    from uni_critique import UniCritique
+    from bi_critique import BiCritique
+    from bi_selector import BivariateSelectorAgent
+
+    recorder = StageRecorder(backend)
+    recorder.wrap(type_detector, "detect_datatypes", "type_detection")
+    recorder.wrap(CoreAgent, "data_preprocessing", "preprocessing")
+    recorder.wrap(PreprocessorCritique, "compare_distribution", "preprocess_critique")
+    recorder.wrap(PreprocessorCritique, "validate_results", "preprocess_critique")
+    recorder.wrap(CoreAgent, "univariate_analysis", "univariate")
+    recorder.wrap(UniCritique, "validate", "critique")
+    recorder.wrap(BiCritique, "validate", "critique")
+    recorder.wrap(BivariateSelectorAgent, "select_bivariate_pairs", "bivariate_selection")
+    recorder.wrap(CoreAgent, "bivariate_analysis", "bivariate")
+    recorder.wrap(CoreAgent, "combine_result", "combine_result")
+
+    result = dict(case)
+    try:
+        os.makedirs(core_agent.UPLOAD_DIR, exist_ok=True)
+        dataset = make_dataset(case["rows"], case["cols"], parse_mix(case["mix"]), case["missing"], options["seed"])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = f"bench_{case['rows']}x{case['cols']}.csv"
+            file_path = os.path.join(tmp_dir, file_name)
+            dataset.to_csv(file_path, index=False)
+            del dataset
+
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                agent = CoreAgent(enable_critique=options["critique"], use_cache=False, incremental=options["incremental"])
+                result_path, _, _ = agent.analyse_dataset(file_path, file_name, "Synthetic benchmark dataset.")
+                result["wall_time"] = round(time.perf_counter() - start, 4)
+            result["columns"] = len(agent.selected_data_types)
+            result["reused_columns"] = len(agent.reused_columns)
+
+        if not options["skip_query"]:
+            from query_agent import QueryAgent
+            recorder.wrap(QueryAgent, "__init__", "query_build")
+            recorder.wrap(QueryAgent, "get_answer", "query")
+            QueryAgent(result_path).get_answer(QUERY)
+        result["result_bytes"] = os.path.getsize(result_path)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["stages"] = recorder.stages
+    result["llm"] = backend.stats()
+    result["peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF)
+    result["peak_children_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    queue.put(result)
+
+
+def run_isolated(case, options):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run_case, args=(case, options, queue))
+    process.start()
+    try:
+        result = queue.get(timeout=options["timeout"])
+    except Exception:
+        process.kill()
+        result = {**case, "error": f"No result within {options['timeout']}s (exit code {process.exitcode})"}
+    process.join()
+    return result
+
+
+# ---------- reporting ----------
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def case_key(case):
+    return f"{case['rows']}x{case['cols']} mix={case['mix']} missing={case['missing']}"
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {case_key(case): case for case in json.load(f)["cases"]}
+
+    print(f"\nComparison against {baseline_path}:")
+    for case in report["cases"]:
+        old = baseline.get(case_key(case))
+        if not old or "wall_time" not in old or "wall_time" not in case:
+            continue
+        print(f"{case_key(case)}: wall {old['wall_time']:.2f}s -> {case['wall_time']:.2f}s "
+              f"({case['wall_time'] / old['wall_time']:.2f}x), rss {old['peak_rss_mb']} -> {case['peak_rss_mb']} MB, "
+              f"llm calls {old['llm']['total_calls']} -> {case['llm']['total_calls']}")
+        for stage, timing in case["stages"].items():
+            old_timing = old.get("stages", {}).get(stage)
+            if old_timing and old_timing["seconds"]:
+                print(f"    {stage}: {old_timing['seconds']:.2f}s -> {timing['seconds']:.2f}s "
+                      f"({timing['seconds'] / old_timing['seconds']:.2f}x)")
+
+
+def smoke(options):
+    """Small end-to-end runs with incremental analysis off and on. Returns the number of failed runs.
+
+    The incremental case analyses the same file twice; the second run must reuse every column.
+    """
+    failures = 0
+    for incremental in (False, True):
+        result = run_isolated(SMOKE_CASE, {**options, "incremental": incremental, "repeat": 2 if incremental else 1})
+        if "error" not in result and incremental and result["reused_columns"] != result["columns"]:
+            result["error"] = f"Second incremental run reused {result['reused_columns']} of {result['columns']} columns"
+        print(f"[SMOKE] incremental={'on' if incremental else 'off'}: {result.get('error') or 'ok'}")
+        failures += "error" in result
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CoreAgent.analyse_dataset with the offline LLM backend.")
+    parser.add_argument("--preset", choices=PRESETS, default="quick")
+    parser.add_argument("--rows", type=int, nargs="+", help="Row counts (overrides the preset).")
+    parser.add_argument("--cols", type=int, nargs="+", help="Column counts (overrides the preset).")
+    parser.add_argument("--mix", nargs="+", default=[DEFAULT_MIX], help="Column type mixes, e.g. continuous=0.5,categorical=0.5.")
+    parser.add_argument("--missing", type=float, nargs="+", default=[0.0, 0.1], help="Fractions of missing cells.")
+    parser.add_argument("--max-cells", type=float, default=5e8, help="Skip cases with more rows*cols than this.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected offline LLM latency per call in seconds.")
+    parser.add_argument("--no-critique", action="store_true", help="Run without the critique loops.")
+    parser.add_argument("--skip-query", action="store_true", help="Skip QueryAgent build and query.")
+    parser.add_argument("--incremental", action="store_true", help="Run with incremental analysis (a fresh column store per case).")
+    parser.add_argument("--repeat", type=int, default=1, help="Analyses of the same file per case; the last one is reported.")
+    parser.add_argument("--smoke", action="store_true", help="Only run a small case with incremental analysis off and on, and exit non-zero on failure.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=6 * 3600, help="Per-case timeout in seconds.")
+    parser.add_argument("--output", default="benchmark_result.json")
+    parser.add_argument("--compare", help="Earlier benchmark JSON to compare against.")
+    args = parser.parse_args()
+
+    options = {
+        "latency": args.latency,
+        "critique": not args.no_critique,
+        "skip_query": args.skip_query,
+        "incremental": args.incremental,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "timeout": args.timeout,
+    }
+    if args.smoke:
+        sys.exit(1 if smoke(options) else 0)
+    rows = args.rows or PRESETS[args.preset]["rows"]
+    cols = args.cols or PRESETS[args.preset]["cols"]
+
+    cases = []
+    for n_rows, n_cols, mix, missing in itertools.product(rows, cols, args.mix, args.missing):
+        case = {"rows": n_rows, "cols": n_cols, "mix": mix, "missing": missing}
+        if n_rows * n_cols > args.max_cells:
+            print(f"[BENCH] Skipping {case_key(case)}: more than {args.max_cells:.0e} cells")
+            continue
+        print(f"[BENCH] Running {case_key(case)}")
+        result = run_isolated(case, options)
+        if "error" in result:
+            print(f"[BENCH] Failed: {result['error']}")
+        else:
+            print(f"[BENCH] {result['wall_time']:.2f}s, {result['peak_rss_mb']} MB, {result['llm']['total_calls']} LLM calls")
+        cases.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": options,
+        "cases": cases,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Results written to {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
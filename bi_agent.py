@@ -1,9 +1,7 @@
 import pandas as pd
 import numpy as np
-import json
-import google.generativeai as genai
+import llm_client
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
 from scipy import stats
 import os
 from dotenv import load_dotenv
@@ -11,22 +9,32 @@ from dotenv import load_dotenv
 load_dotenv()
 from kb_statistical import StatisticalKnowledgeBase
 import utils
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY3")
+import llm_schemas
+import instrumentation
+import vis_renderer
+import plot_data
+import plot_templates
+import artifacts
+VISUALIZATION_SELECTION = os.getenv("VISUALIZATION_SELECTION", "llm")
 
 class BivariateAnalyzer:
-    def __init__(self, knowledge_base: StatisticalKnowledgeBase):
+    def __init__(self, knowledge_base: StatisticalKnowledgeBase, renderer: vis_renderer.VisualizationRenderer = None, artifact_dir: str = artifacts.UPLOAD_DIR):
         self.knowledge_base = knowledge_base
-        genai.configure(api_key=GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+        self.renderer = renderer
+        self.artifact_dir = artifact_dir
+        self.model = llm_client.get_model(llm_client.MODEL_NAME)
         self.knowledge = None
+        self.fragments = None
+        self.var_types = None
         self.priority_test_result = None
 
     def fetch_knowledge(self, var_type1, var_type2):
+        self.var_types = (var_type1, var_type2)
         combined_var_type = f"{var_type1} + {var_type2}"
-        doc = self.knowledge_base.search_knowledge("bivariate", combined_var_type)
-        if doc == "No relevant statistical test found.":
+        self.fragments = self.knowledge_base.fragments("bivariate", combined_var_type)
+        if self.fragments is None:
             raise ValueError("No statistical knowledge found for this variable type.")
-        self.knowledge = json.loads(doc)
+        self.knowledge = self.fragments.knowledge
 
     def analyze(self, data_column1: pd.Series, var_type1: str, col_name1: str, metadata1: str, data_column2: pd.Series, var_type2: str, col_name2: str, metadata2: str):
         self.fetch_knowledge(var_type1, var_type2)
@@ -37,21 +45,17 @@ class BivariateAnalyzer:
 
         return desc_result, vis_result, inferential_result
 
+    @instrumentation.traced("bi_descriptive")
     def perform_descriptive_stats(self, data_column1: pd.Series, metadata1: str, data_column2: pd.Series, metadata2: str, previous_error = ""):
         try:
-            priority_tests = self.knowledge.get("priority_tests", [])
-            descriptive_stats = self.knowledge.get("descriptive", {}).get("statistics", [])
-            selection_criteria = self.knowledge.get("descriptive", {}).get("selection_criteria", [])
-            application_criteria = self.knowledge.get("descriptive", {}).get("application_criteria", [])
-
             descriptive_prompt = f"""
                 You are a statistical Python code generator. Generate Python code to calculate the following using numpy, pandas, scipy and statsmodels as needed.
 
                 Priority Tests:
-                {json.dumps(priority_tests, indent=2)}
+                {self.fragments["priority_tests"]}
 
                 Descriptive Statistics:
-                {json.dumps(descriptive_stats, indent=2)}
+                {self.fragments["descriptive_statistics"]}
 
                 {f"Previous response error: {previous_error}" if previous_error else ""}
 
@@ -84,22 +88,21 @@ class BivariateAnalyzer:
                 'data_column1': data_column1,
                 'data_column2': data_column2
             }
-            exec(python_code, {}, local_vars)
+            instrumentation.run_code(python_code, {}, local_vars, step="descriptive")
 
             intermediate_result = local_vars.get('result')
-            serializable_result = utils.convert_to_serializable(intermediate_result)
 
             reasoning_prompt = f"""
                 You are a statistical reasoning assistant. Based on the following bivariate test results, selection criteria, and application criteria, finalize the preferred statistics and summarize key findings.
 
                 Test Results:
-                {json.dumps(serializable_result, indent=2)}
+                {utils.to_json(intermediate_result, indent=2)}
 
                 Selection Criteria:
-                {json.dumps(selection_criteria, indent=2)}
+                {self.fragments["descriptive_selection"]}
 
                 Application Criteria:
-                {json.dumps(application_criteria, indent=2)}
+                {self.fragments["descriptive_application"]}
 
                 Metadata:
                 Column 1: {metadata1}
@@ -131,10 +134,9 @@ class BivariateAnalyzer:
                 - Do not return any additional text or explanation outside the JSON structure.
             """
 
-            response = self.model.generate_content(reasoning_prompt)
-            json_string = utils.extract_json_from_response(response.text)
-
-            descriptive_result = json.loads(json_string)
+            response = self.model.generate_content(reasoning_prompt, generation_config=llm_schemas.json_config())
+            descriptive_result = llm_schemas.parse(response.text)
+            descriptive_result["computed_results"] = intermediate_result
             return descriptive_result
         except Exception as e:
             return {
@@ -144,71 +146,65 @@ class BivariateAnalyzer:
             }
 
 
+    @instrumentation.traced("bi_visualization")
     def perform_visualization(self, data_column1, column_name1, data_column2, column_name2, desc_result, previous_error = ""):
         try:
-            prompt = f"""
-            You are a statistical visualization assistant. Based on statistical knowledge and the provided **two** data columns and descriptive statistics, suggest the **two most appropriate bivariate visualizations**.
+            pair_plot_data = plot_data.prepare_bivariate(data_column1, self.var_types[0], data_column2, self.var_types[1])
+            visualization_suggestions = {}
+
+            if VISUALIZATION_SELECTION != "rule":
+                templates = plot_templates.available_templates(self.knowledge)
+                prompt = f"""
+                You are a statistical visualization assistant. Based on statistical knowledge and the provided **two** data columns and descriptive statistics, suggest the **two most appropriate bivariate visualizations**.
 
-            Visualization Options and Selection Criteria:
-            {json.dumps(self.knowledge.get("visualization", {}), indent=2)}
+                Visualization Options and Selection Criteria:
+                {self.fragments["visualization"]}
 
-            Descriptive Statistics Result:
-            {json.dumps(desc_result, indent=2)}
+                Descriptive Statistics Result:
+                {utils.to_json(desc_result, indent=2)}
 
-            Data Column 1 - {column_name1} describe:
-            {data_column1.describe()}
+                Data Column 1 - {column_name1} describe:
+                {data_column1.describe()}
 
-            Data Column 2 - {column_name2} describe:
-            {data_column2.describe()}
+                Data Column 2 - {column_name2} describe:
+                {data_column2.describe()}
 
-            {f"Previous response error: {previous_error}" if previous_error else ""}
+                {f"Previous response error: {previous_error}" if previous_error else ""}
 
-            Instructions:
-            - Assume 'data_column1' and 'data_column2' are pandas Series already defined.
-            - Select the two most appropriate visualizations based on the data types, distribution, and descriptive statistics.
-            - For each visualization, provide:
-                - "name": the name of the selected plot (e.g., 'Scatter Plot', 'Hexbin Plot', 'Box Plot by Category').
-                - Python code using matplotlib.pyplot to visualize the relationship.
-                - Use the variables `data_column1` and `data_column2` in the code directly.
-                - Do not include any comments and print statements.
-                - Save each plot as: 'uploads/bi_{column_name1}_{column_name2}_vis1.png' and 'uploads/bi_{column_name1}_{column_name2}_vis2.png'.
-                - Choose graph size and axis ranges based on the min and max values of the data.
+                Instructions:
+                - Select the two most appropriate visualizations based on the data types, distribution, and descriptive statistics.
+                - "name" must be exactly one of: {templates}
+                - The plots are drawn by built-in templates, so do not return any code.
                 - "reason": clearly explain why this plot is suitable for the given pair of columns.
                 - If only one visualization is applicable, return just one.
                 - Return ONLY a JSON dictionary in the following format:
                 {{
                     "visualization_1": {{
                         "name": "name of selected plot",
-                        "python_code": "code_here",
                         "reason": "reason_here"
                     }},
                     "visualization_2": {{
                         "name": "name of selected plot",
-                        "python_code": "code_here",
                         "reason": "reason_here"
                     }}
                 }}
-            """
+                """
 
-            response = self.model.generate_content(prompt)
+                response = self.model.generate_content(
+                    prompt, generation_config=llm_schemas.json_config(llm_schemas.VisualizationSelection, {"name": templates})
+                )
+                visualization_suggestions = llm_schemas.parse(response.text, llm_schemas.VisualizationSelection)
 
-            json_string = utils.extract_json_from_response(response.text)
-            visualization_suggestions = json.loads(json_string)
+            visualization_suggestions = plot_templates.resolve_selection(visualization_suggestions, self.knowledge, pair_plot_data)
 
-            local_vars = {
-                'plt': plt,
-                'data_column1': data_column1,
-                'data_column2': data_column2
-            }
-
-            if "visualization_1" in visualization_suggestions:
-                exec_code_1 = visualization_suggestions['visualization_1']['python_code']
-                exec(exec_code_1, local_vars)
+            for vis_key, vis_info in visualization_suggestions.items():
+                image_path = artifacts.image_path(self.artifact_dir, "bi", column_name1, column_name2, index=vis_key[-1])
+                args = (vis_info["name"], "bivariate", pair_plot_data, image_path, f"{column_name1} vs {column_name2} - {vis_info['name']}")
+                if self.renderer:
+                    self.renderer.submit(f"{column_name1}-{column_name2}", vis_info, vis_renderer.render_template, *args)
+                else:
+                    vis_info.update(vis_renderer.render_template(*args))
 
-            if "visualization_2" in visualization_suggestions:
-                exec_code_2 = visualization_suggestions['visualization_2']['python_code']
-                exec(exec_code_2, local_vars)
-            
             return visualization_suggestions
 
         except Exception as e:
@@ -218,22 +214,19 @@ class BivariateAnalyzer:
                 "data": None
             }
 
+    @instrumentation.traced("bi_inferential")
     def perform_inferential_stats(self, data_column1, metadata1, data_column2, metadata2, desc_result, previous_error = ""):
         try:
-            inferential_tests = self.knowledge.get("inferential", {}).get("tests", [])
-            selection_criteria = self.knowledge.get("inferential", {}).get("selection_criteria", [])
-            application_criteria = self.knowledge.get("inferential", {}).get("application_criteria", [])
-
             inferential_prompt = f"""
                 You are a statistical inference expert. Perform the following task carefully:
                 Available Inferential Tests:
-                {json.dumps(inferential_tests, indent=2)}
+                {self.fragments["inferential_tests"]}
                 Selection Criteria:
-                {json.dumps(selection_criteria, indent=2)}
+                {self.fragments["inferential_selection"]}
                 Application Criteria:
-                {json.dumps(application_criteria, indent=2)}
+                {self.fragments["inferential_application"]}
                 Descriptive Statistics Results:
-                {json.dumps(desc_result, indent=2)}
+                {utils.to_json(desc_result, indent=2)}
                 Metadata for Variable 1:
                 {metadata1}
                 Metadata for Variable 2:
@@ -267,14 +260,13 @@ class BivariateAnalyzer:
                 - Do not return any explanations or text outside this JSON structure.
             """
 
-            response = self.model.generate_content(inferential_prompt)
-            json_string = utils.extract_json_from_response(response.text)
-            inferential_results = json.loads(json_string)
+            response = self.model.generate_content(inferential_prompt, generation_config=llm_schemas.json_config())
+            inferential_results = llm_schemas.parse(response.text)
 
             for test_name, test_details in inferential_results.items():
                 local_vars = {'data_column1': data_column1, 'data_column2': data_column2}
                 print(f"{test_name} pythong code: ", test_details['python_code'])
-                exec(test_details['python_code'], local_vars)
+                instrumentation.run_code(test_details['python_code'], local_vars, step="inferential", test=test_name)
                 result = local_vars.get('result')
 
                 inferential_results[test_name]['result'] = result
@@ -284,7 +276,7 @@ class BivariateAnalyzer:
                 You are a statistical inference reasoning assistant.
 
                 Test Selection and results:
-                {json.dumps(inferential_results, indent=2)}
+                {utils.to_json(inferential_results, indent=2)}
 
                 {f"Previous response error: {previous_error}" if previous_error else ""}
 
@@ -310,9 +302,8 @@ class BivariateAnalyzer:
                 - Do not return any explanations or text outside this JSON structure.
             """
 
-            conclusion_response = self.model.generate_content(conclusion_prompt)
-            final_json_string = utils.extract_json_from_response(conclusion_response.text)
-            final_inferential_results = json.loads(final_json_string)
+            conclusion_response = self.model.generate_content(conclusion_prompt, generation_config=llm_schemas.json_config())
+            final_inferential_results = llm_schemas.parse(conclusion_response.text)
 
             return final_inferential_results
         except Exception as e:
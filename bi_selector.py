@@ -1,24 +1,29 @@
 import pandas as pd
 from itertools import combinations
-import google.generativeai as genai
+import llm_client
 from scipy.stats import pearsonr, chi2_contingency, ttest_ind, f_oneway
 import os
 import json
 from dotenv import load_dotenv
 
 load_dotenv()
-import utils
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY3")
+import llm_schemas
+from dataset_profile import DatasetProfile
+
+SELECTOR_MODEL = "gemini-1.5-flash"
+MAX_PAIRS = 3
+CORRELATION_THRESHOLD = 0.3
 
 class BivariateSelectorAgent:
-    def __init__(self, variable_types: dict, max_pairs: int = 3, correlation_threshold: float = 0.3):
-        genai.configure(api_key=GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
+    def __init__(self, variable_types: dict, max_pairs: int = MAX_PAIRS, correlation_threshold: float = CORRELATION_THRESHOLD):
+        self.model = llm_client.get_model(SELECTOR_MODEL)
         self.variable_types = variable_types
         self.max_pairs = max_pairs
         self.correlation_threshold = correlation_threshold
 
-    def compute_statistics(self, df: pd.DataFrame):
+    def compute_statistics(self, df: pd.DataFrame, profile: DatasetProfile = None):
+        """Screening test for every column pair; rows missing either value are left out using the profile's null masks."""
+        profile = profile or DatasetProfile(df)
         pairs = []
 
         for var1, var2 in combinations(df.columns, 2):
@@ -26,11 +31,12 @@ class BivariateSelectorAgent:
             type2 = self.variable_types[var2]
 
             result = {"pair": [var1, var2], "types": [type1, type2], "test": None, "stat_value": None, "p_value": None}
+            valid = profile.valid_mask(var1, var2)
 
             # Numerical - Numerical: Pearson Correlation
             if 'numerical' in type1 and 'numerical' in type2:
                 try:
-                    corr, p_value = pearsonr(df[var1].dropna(), df[var2].dropna())
+                    corr, p_value = pearsonr(df[var1][valid], df[var2][valid])
                     result.update({"test": "Pearson Correlation", "stat_value": corr, "p_value": p_value})
                 except:
                     continue
@@ -39,7 +45,7 @@ class BivariateSelectorAgent:
             elif ('numerical' in type1 and 'categorical' in type2) or ('categorical' in type1 and 'numerical' in type2):
                 numerical_var = var1 if 'numerical' in type1 else var2
                 categorical_var = var2 if 'numerical' in type1 else var1
-                groups = [df[numerical_var][df[categorical_var] == cat].dropna() for cat in df[categorical_var].dropna().unique()]
+                groups = [group.to_numpy() for _, group in df[numerical_var][valid].groupby(df[categorical_var][valid], sort=False)]
                 try:
                     if len(groups) == 2:
                         stat, p_value = ttest_ind(groups[0], groups[1], equal_var=False)
@@ -91,22 +97,23 @@ class BivariateSelectorAgent:
         {pairs}
         """
 
-        response = self.model.generate_content(prompt)
+        response = self.model.generate_content(
+            prompt, generation_config=llm_schemas.json_config(llm_schemas.PairSelection, {"pair": list(df.columns)})
+        )
         return response.text
 
-    def select_bivariate_pairs(self, file_path: str, context: str):
-        df = pd.read_csv(file_path)
-        candidate_pairs = self.compute_statistics(df)
+    def select_bivariate_pairs(self, df: pd.DataFrame, context: str, profile: DatasetProfile = None):
+        candidate_pairs = self.compute_statistics(df, profile)
 
         if not candidate_pairs:
             print("No suitable pairs found.")
             return []
 
         gemini_response = self.ask_gemini_to_select_pairs(candidate_pairs, df, context)
-        selected_pairs = json.loads(utils.extract_json_from_response(gemini_response))
+        selected_pairs = llm_schemas.parse(gemini_response, llm_schemas.PairSelection)
         return selected_pairs["selected_pairs"]
 
 # types =  {'Maths': 'numerical discrete', 'Physics': 'numerical discrete', 'Chemistry': 'numerical discrete'}
 # bi_selector = BivariateSelectorAgent(types)
-# selected_pairs = bi_selector.select_bivariate_pairs("uploads/student_marks_pre.csv", "this is dataset of marks obtained by PU students in PES college and consider maths and physics columns are related")
+# selected_pairs = bi_selector.select_bivariate_pairs(pd.read_csv("uploads/student_marks_pre.csv"), "this is dataset of marks obtained by PU students in PES college and consider maths and physics columns are related")
 # print(selected_pairs)
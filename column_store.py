@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+import pandas as pd
+
+import result_cache
+import utils
+
+INCREMENTAL_ANALYSIS = os.getenv("INCREMENTAL_ANALYSIS", "0") == "1"
+COLUMN_STORE_DIR = os.getenv("COLUMN_STORE_DIR", os.path.join("uploads", "column_store"))
+# Entries not reused for this many days are dropped when a store is opened.
+COLUMN_STORE_MAX_AGE_DAYS = float(os.getenv("COLUMN_STORE_MAX_AGE_DAYS", "30"))
+
+
+def column_hash(data_column: pd.Series) -> str:
+    """Content hash of one column: name, dtype and every value in row order."""
+    hasher = hashlib.sha256(f"{data_column.name}\0{data_column.dtype}\0".encode())
+    hasher.update(pd.util.hash_pandas_object(data_column, index=True).values.tobytes())
+    return hasher.hexdigest()
+
+
+def unit_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def analysis_version(model_names=(), options: dict = None, kb_files=result_cache.KB_FILES) -> str:
+    """Hash of the KB files, models and options, so stored results go stale when any of them change."""
+    hasher = hashlib.sha256(f"v{result_cache.CACHE_VERSION}\0{json.dumps(list(model_names))}\0{json.dumps(options or {}, sort_keys=True)}\0".encode())
+    for kb_file in kb_files:
+        result_cache.update_with_file(hasher, kb_file)
+    return hasher.hexdigest()
+
+
+class ColumnStore:
+    """Per-column and per-pair results from earlier analyses, for incremental re-analysis.
+
+    Entries are JSON values keyed by (kind, key) in SQLite. Imputed columns
+    are kept as pickles, and plot images and outlier index files are copied
+    next to the database so later runs cannot overwrite them.
+    """
+
+    def __init__(self, store_dir: str = COLUMN_STORE_DIR, max_age_days: float = COLUMN_STORE_MAX_AGE_DAYS):
+        self.store_dir = store_dir
+        self.db_path = os.path.join(store_dir, "columns.sqlite3")
+        os.makedirs(os.path.join(store_dir, "series"), exist_ok=True)
+        os.makedirs(os.path.join(store_dir, "images"), exist_ok=True)
+        os.makedirs(os.path.join(store_dir, "outliers"), exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (kind TEXT, key TEXT, value TEXT, accessed REAL, PRIMARY KEY (kind, key))")
+        self.prune(max_age_days)
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, kind: str, key: str):
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE kind = ? AND key = ?", (time.time(), kind, key))
+        return json.loads(row[0])
+
+    def put(self, kind: str, key: str, value):
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (kind, key, value, accessed) VALUES (?, ?, ?, ?)",
+                (kind, key, utils.to_json(value), time.time())
+            )
+
+    def series_path(self, key: str):
+        return os.path.join(self.store_dir, "series", f"{key}.pkl")
+
+    def get_series(self, key: str):
+        path = self.series_path(key)
+        return pd.read_pickle(path) if os.path.exists(path) else None
+
+    def put_series(self, key: str, data_column: pd.Series):
+        data_column.to_pickle(self.series_path(key))
+
+    def keep_images(self, key: str, visual_result: dict):
+        """Copy a section's rendered images into the store; returns the section with image paths rewritten.
+
+        Only the rewritten entries are copied, so the live result keeps its run paths; put() serializes it with utils.to_json.
+        """
+        stored = dict(visual_result)
+        for vis_key, vis_info in visual_result.items():
+            image_path = vis_info.get("image_path") if isinstance(vis_info, dict) else None
+            if image_path and os.path.exists(image_path):
+                stored_path = os.path.join(self.store_dir, "images", f"{key}_{vis_key}{os.path.splitext(image_path)[1]}")
+                shutil.copy2(image_path, stored_path)
+                stored[vis_key] = {**vis_info, "image_path": stored_path}
+        return stored
+
+    def outliers_path(self, key: str):
+        return os.path.join(self.store_dir, "outliers", f"{key}.npy")
+
+    def keep_outliers(self, key: str, outlier_result: dict):
+        """Copy a column's outlier index file into the store; returns the result pointing at the copy."""
+        index_file = outlier_result.get("outlier_index_file")
+        if not index_file or not os.path.exists(index_file):
+            return outlier_result
+        shutil.copy2(index_file, self.outliers_path(key))
+        return {**outlier_result, "outlier_index_file": self.outliers_path(key)}
+
+    def prune(self, max_age_days: float):
+        cutoff = time.time() - max_age_days * 86400
+        with self.connect() as conn:
+            stale = [key for (key,) in conn.execute("SELECT DISTINCT key FROM entries WHERE accessed < ?", (cutoff,))]
+            conn.execute("DELETE FROM entries WHERE accessed < ?", (cutoff,))
+            stale = [key for key in stale if conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is None]
+        for key in stale:
+            for path in [self.series_path(key), self.outliers_path(key)] + [os.path.join(self.store_dir, "images", f"{key}_visualization_{i}.png") for i in (1, 2)]:
+                if os.path.exists(path):
+                    os.remove(path)
@@ -1,102 +1,326 @@
 import pandas as pd
-import google.generativeai as genai
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from kb_preprocess import PreprocessorKB
-from kb_statistical import StatisticalKnowledgeBase
 from preprocess_agent import PreprocessorAgent
 from preprocess_critique import PreprocessorCritique
-from uni_agent import UnivariateAnalyzer
+from uni_agent import UnivariateAnalyzer, VISUALIZATION_SELECTION
 from uni_critique import UniCritique
-from bi_selector import BivariateSelectorAgent
+from bi_selector import BivariateSelectorAgent, SELECTOR_MODEL, MAX_PAIRS, CORRELATION_THRESHOLD
 from bi_agent import BivariateAnalyzer
 from bi_critique import BiCritique
 import type_detector
+import instrumentation
+import llm_client
+import result_cache
+import column_store
+import artifacts
+import result_store
+import utils
+import resources
+import dataset_profile
+import critique_checks
+import llm_schemas
+import outliers
+from vis_renderer import VisualizationRenderer
 from dotenv import load_dotenv
 
 load_dotenv()
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = artifacts.UPLOAD_DIR
+ENABLE_CRITIQUE = os.getenv("ENABLE_CRITIQUE", "0") == "1"
+CRITIQUE_MAX_RETRIES = int(os.getenv("CRITIQUE_MAX_RETRIES", "3"))
+CRITIQUE_MAX_SECONDS = float(os.getenv("CRITIQUE_MAX_SECONDS", "60"))
+CRITIQUE_ESCALATE = os.getenv("CRITIQUE_ESCALATE", "0") == "1"
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "8"))
+# Columns missing a larger share of their values are not analysed.
+MAX_MISSING_SHARE = float(os.getenv("MAX_MISSING_SHARE", "0.3"))
+
+class AnalysisCancelled(Exception):
+    """Raised by an on_event callback to stop a running analysis."""
+
 
 class CoreAgent:
-    def __init__(self):
-        self.stat_kb = StatisticalKnowledgeBase(persist_dir='stat_kb_dir')
-        self.preprocess_kb = PreprocessorKB(persist_dir='preprocess_kb_dir')
+    def __init__(self, enable_critique: bool = ENABLE_CRITIQUE, on_event=None, use_cache: bool = result_cache.RESULT_CACHE_ENABLED,
+                 incremental: bool = column_store.INCREMENTAL_ANALYSIS):
+        """on_event, if given, is called with a progress event dict as each stage, column and pair finishes.
+
+        With incremental=True, columns whose content, type and metadata match
+        an earlier analysis reuse its results, as do pairs of such columns.
+        """
+        self.enable_critique = enable_critique
+        self.on_event = on_event
+        self.result_cache = result_cache.ResultCache() if use_cache else None
+        self.column_store = column_store.ColumnStore() if incremental else None
+        self.unit_keys = {}
+        self.stat_kb = None
+        self.preprocess_kb = None
+
+    def emit(self, event_type: str, **payload):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event({"type": event_type, "time": time.time(), **payload})
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            print(f"[WARN] Progress callback failed: {e}")
+
+    def model_names(self):
+        return [llm_client.LLM_BACKEND, llm_client.MODEL_NAME, SELECTOR_MODEL]
+
+    def analysis_options(self):
+        """Every setting besides the data, context, KB files and models that changes the combined result."""
+        return {
+            "critique": self.enable_critique,
+            "critique_budget": [CRITIQUE_MAX_RETRIES, CRITIQUE_MAX_SECONDS, CRITIQUE_ESCALATE] if self.enable_critique else None,
+            "visualization_selection": VISUALIZATION_SELECTION,
+            "pair_selection": [MAX_PAIRS, CORRELATION_THRESHOLD],
+            "max_missing_share": MAX_MISSING_SHARE,
+            "structured_output": llm_schemas.LLM_STRUCTURED_OUTPUT,
+            "outlier_storage": [outliers.OUTLIER_SAMPLE_SIZE, outliers.OUTLIER_MAX_RUNS]
+        }
 
-    def analyse_dataset(self, file_path: str, file_name, data_context: str):
+    def analyse_dataset(self, file_path: str, file_name, data_context: str, run_id: str = None):
+        """Analyse one CSV. Every artifact of the run is written under uploads/runs/<run_id>."""
         self.data_context = data_context
         self.file_path = file_path
         self.file_name = os.path.splitext(file_name)[0]
+
+        if self.result_cache is not None:
+            self.cache_key = result_cache.cache_key(file_path, data_context, model_names=self.model_names(), options=self.analysis_options())
+            cached = self.result_cache.get(self.cache_key)
+            if cached:
+                print(f"\nCACHE HIT: {cached['result_path']}\n")
+                self.emit("cache_hit", result_path=cached["result_path"])
+                self.emit("done", result_path=cached["result_path"])
+                return cached["result_path"], cached["selected_data_types"], cached["selected_pairs"]
+
+        self.run_id = run_id or artifacts.new_run_id()
+        self.run_dir = artifacts.create_run_dir(self.run_id)
+        artifacts.collect_garbage(keep=[self.run_dir])
+        self.result_output_path = os.path.join(self.run_dir, f"{artifacts.safe_name(self.file_name)}_result.json")
+        # Progress events carry only names; a listener reads the bodies from this store as they are added.
+        self.store_path = result_store.store_path(self.result_output_path)
+        self.emit("started", store_path=self.store_path)
+
         self.dataset = pd.read_csv(file_path)
         self.dataset_pre = None
-        self.stat_kb.load_knowledge('uni_bi_kb.json')
-        self.preprocess_kb.load_knowledge('preprocess_kb.json')
-        self.column_data_type = type_detector.detect_datatypes(self.dataset)
-        print("\ntype detector: ", self.column_data_type)
-    
-        self.data_preprocessing(self.dataset, data_context)
-        self.univariate_analysis()
-        self.bivariate_analysis()
-        print("\n\nANALYSIS DONE. SENDING TO QUERY AGENT\n\n")
-        self.combine_result()
+        self.profile_pre = None
+        self.reused_columns = []
+        self.reused_pairs = []
+        if self.column_store is not None:
+            self.column_keys = {col: column_store.column_hash(self.dataset[col]) for col in self.dataset.columns}
+            self.analysis_version = column_store.analysis_version(self.model_names(), self.analysis_options())
+        with instrumentation.collect() as self.trace, instrumentation.span("analyse_dataset", file_name=self.file_name):
+            with instrumentation.span("load_knowledge"):
+                # Shared by every run in this process; loaded on first use or when a KB file changes.
+                self.stat_kb = resources.stat_kb()
+                self.preprocess_kb = resources.preprocess_kb()
+            with instrumentation.span("profile"):
+                # Built once; type detection, preprocessing and its critique read it instead of rescanning columns.
+                self.profile = dataset_profile.DatasetProfile(self.dataset)
+            self.emit("stage", stage="type_detection")
+            with instrumentation.span("type_detection"):
+                self.column_data_type = self.detect_types()
+            print("\ntype detector: ", self.column_data_type)
+
+            self.data_preprocessing(self.dataset, data_context)
+            # One retry and time budget for every univariate and bivariate critique of this analysis.
+            self.critique_budget = critique_checks.CritiqueBudget(CRITIQUE_MAX_RETRIES, CRITIQUE_MAX_SECONDS)
+            self.renderer = VisualizationRenderer()
+            try:
+                self.univariate_analysis()
+                self.bivariate_analysis()
+            finally:
+                self.renderer.shutdown()
+            print("\n\nANALYSIS DONE. SENDING TO QUERY AGENT\n\n")
+            self.combine_result()
+        if self.result_cache is not None:
+            self.result_output_path = self.result_cache.put(self.cache_key, self.result_output_path, self.selected_data_types, self.selected_pairs)
+        artifacts.release_run_dir(self.run_dir)
+        self.emit("done", result_path=self.result_output_path)
 
         return self.result_output_path, self.selected_data_types, self.selected_pairs
 
+    def detect_types(self):
+        if self.column_store is None:
+            return type_detector.detect_datatypes(self.dataset, self.profile)
+
+        column_types = {col: self.column_store.get("type", key) for col, key in self.column_keys.items()}
+        changed = [col for col, col_type in column_types.items() if col_type is None]
+        print(f"\nType detection: {len(changed)} new or changed columns")
+        if changed:
+            detected = type_detector.detect_column_types(self.dataset[changed], self.profile)
+            for col in changed:
+                if col in detected:
+                    self.column_store.put("type", self.column_keys[col], detected[col])
+            column_types.update(detected)
+        return type_detector.resolve_time_series({col: t for col, t in column_types.items() if t is not None})
+
+    def plan_preprocessing(self, preprocess_agent, data_context):
+        """The dataset's preprocessing plan and the column metadata taken from it."""
+        plan = preprocess_agent.plan(self.dataset, self.column_data_type, data_context, self.profile)
+        metadata = {col: column["description"] for col, column in plan["columns"].items()}
+        metadata["dataset_desc"] = plan["dataset_desc"]
+        if self.column_store is not None:
+            # Metadata is part of the unit keys, so an unchanged column keeps its first description and its stored results.
+            for col, col_type in self.column_data_type.items():
+                key = column_store.unit_key(self.column_keys.get(col), col_type, data_context)
+                stored = self.column_store.get("metadata", key)
+                if stored is None:
+                    self.column_store.put("metadata", key, metadata[col])
+                else:
+                    metadata[col] = stored
+        return plan, metadata
+
+    def reused_preprocessing(self, column):
+        if self.column_store is None:
+            return None
+        stored = self.column_store.get("preprocess", self.unit_keys[column])
+        if stored and stored["imputed"]:
+            stored["imputed_data"] = self.column_store.get_series(self.unit_keys[column])
+            if stored["imputed_data"] is None:
+                return None
+        return stored
+
+    def store_preprocessing(self, column, outlier_result, imputed_data):
+        if self.column_store is None:
+            return
+        if imputed_data is not None:
+            self.column_store.put_series(self.unit_keys[column], imputed_data)
+        self.column_store.put("preprocess", self.unit_keys[column], {
+            "outlier_result": self.column_store.keep_outliers(self.unit_keys[column], outlier_result),
+            "imputed": imputed_data is not None
+        })
+
+    def pair_key(self, col1, col2):
+        return column_store.unit_key(self.unit_keys[col1], self.unit_keys[col2])
+
+    def reused_sections(self, kind, key):
+        return self.column_store.get(kind, key)
+
+    def store_sections(self, kind, key, desc_result, vis_result, inf_result):
+        if self.column_store is None:
+            return
+        self.column_store.put(kind, key, {
+            "descriptive": desc_result,
+            "visual": self.column_store.keep_images(key, vis_result),
+            "inferential": inf_result
+        })
+
+    @instrumentation.traced("preprocessing")
     def data_preprocessing(self, dataset: pd.DataFrame, data_context: str):
         print("\nSTART_PREPROECSSING")
-        preprocess_agent = PreprocessorAgent(self.preprocess_kb)
-
-        self.metadata = preprocess_agent.metadata_generator(self.column_data_type, data_context)
-        self.selected_data_types = preprocess_agent.feature_remover(self.column_data_type, self.metadata, data_context)
-        self.outlier_result = {}
-        self.dataset_pre = pd.DataFrame()
+        self.emit("stage", stage="preprocessing")
+        preprocess_agent = PreprocessorAgent(self.preprocess_kb, artifact_dir=self.run_dir)
 
+        with instrumentation.span("preprocess_plan"):
+            self.preprocess_plan, self.metadata = self.plan_preprocessing(preprocess_agent, data_context)
+        complete_enough = self.profile.columns_within_null_share(MAX_MISSING_SHARE)
         self.selected_data_types = {
-            col: dtype for col, dtype in self.selected_data_types.items()
-            if dataset[col].isnull().mean() <= 0.3
+            col: dtype for col, dtype in self.column_data_type.items()
+            if self.preprocess_plan["columns"][col]["keep"] and col in complete_enough
         }
         print("\nSelected columns: ", self.selected_data_types)
-        for column, col_type in self.selected_data_types.items():
-            preprocess_agent.fetch_knowledge(col_type)
-            out_result = preprocess_agent.outlier_detector(data_column=dataset[column], data_type=col_type, metadata=self.metadata[column])
-            self.outlier_result[column] = out_result
-            if dataset[column].isnull().any():
-                miss_val_result = preprocess_agent.missing_value_imputer(data_column=dataset[column], data_type=col_type, metadata=self.metadata[column])
-
-                if "imputed_data" in miss_val_result:
-                    self.dataset_pre[column] = miss_val_result["imputed_data"]
-                else:
-                    self.dataset_pre[column] = dataset[column]
-            else:
-                self.dataset_pre[column] = dataset[column]
-                print(f"No missing values in column: {column}")
+        self.emit("columns_selected", columns=self.selected_data_types)
+        if self.column_store is not None:
+            self.unit_keys = {
+                col: column_store.unit_key(self.column_keys.get(col), col_type, self.metadata.get(col), self.analysis_version)
+                for col, col_type in self.selected_data_types.items()
+            }
 
-        self.processed_file_path = os.path.join(UPLOAD_DIR, f"{self.file_name}_pre.csv")
+        outlier_result = {}
+        preprocessed = {}
+        pending = []
+        for column in self.selected_data_types:
+            stored = self.reused_preprocessing(column)
+            if stored is None:
+                pending.append(column)
+                continue
+            outlier_result[column] = stored["outlier_result"]
+            preprocessed[column] = stored["imputed_data"] if stored["imputed"] else dataset[column]
+
+        def preprocess(column):
+            with instrumentation.span("preprocess_column", column=column):
+                return preprocess_agent.preprocess_column(
+                    dataset[column], self.selected_data_types[column], self.preprocess_plan["columns"][column], self.profile.has_nulls(column)
+                )
+
+        # Every method is named in the plan and runs natively, so the columns are preprocessed in parallel.
+        with ThreadPoolExecutor(max_workers=max(1, min(PREPROCESS_WORKERS, len(pending)))) as executor:
+            results = list(executor.map(lambda column: instrumentation.bind(preprocess)(column), pending))
+        for column, (out_result, imputed_data) in zip(pending, results):
+            outlier_result[column] = out_result
+            preprocessed[column] = imputed_data if imputed_data is not None else dataset[column]
+            self.store_preprocessing(column, out_result, imputed_data)
+
+        self.outlier_result = {column: outlier_result[column] for column in self.selected_data_types}
+        self.dataset_pre = pd.DataFrame({column: preprocessed[column] for column in self.selected_data_types})
+        self.profile_pre = dataset_profile.DatasetProfile(self.dataset_pre)
+
+        self.processed_file_path = os.path.join(self.run_dir, f"{artifacts.safe_name(self.file_name)}_pre.csv")
         self.dataset_pre.to_csv(self.processed_file_path, index=False)
 
         print("\noutlier_result: \n", self.outlier_result)
-        preprocess_critique = PreprocessorCritique(self.file_path, self.processed_file_path, self.selected_data_types)
-        self.distribution_result = preprocess_critique.compare_distribution()
+        with instrumentation.span("preprocess_critique"):
+            preprocess_critique = PreprocessorCritique(self.dataset, self.dataset_pre, self.selected_data_types, self.profile, self.profile_pre)
+            self.distribution_result = preprocess_critique.compare_distribution()
+            self.preprocess_validation = preprocess_critique.validate_results(self.outlier_result)
         print("\nPreprocess Critique Result: \n", self.distribution_result)
+        print("\nPreprocess Validation Result: \n", self.preprocess_validation)
+        if self.on_event is not None:
+            result_store.put_rows(self.store_path, result_store.preprocessing_rows({
+                "outlier_result": self.outlier_result,
+                "distribution_result": self.distribution_result,
+                "validation_result": self.preprocess_validation
+            }))
+        self.emit("preprocessing")
         print("\nEND_PREPROECSSING")
 
 
+    @instrumentation.traced("univariate")
     def univariate_analysis(self):
         print("\nSTART UNIVARIATE\n")
-        uni_analyser = UnivariateAnalyzer(self.stat_kb)
-        # uni_critique = UniCritique(self.stat_kb)
+        self.emit("stage", stage="univariate")
+        uni_analyser = UnivariateAnalyzer(self.stat_kb, self.renderer, artifact_dir=self.run_dir)
         self.uni_desc_result = {}
         self.uni_visual_result = {}
         self.uni_inferential_result = {}
 
         for col, col_type in self.selected_data_types.items():
-            desc_result, vis_result, inf_result = uni_analyser.analyze(self.dataset_pre[col], col_type, self.metadata[col], col)
-            # desc_result, vis_result, inf_result= uni_critique.validate(self.dataset_pre[col],col_type, self.metadata[col], col, desc_result, vis_result, inf_result)
-            
+            stored = self.reused_sections("univariate", self.unit_keys[col]) if self.column_store is not None else None
+            if stored is not None:
+                self.reused_columns.append(col)
+                desc_result, vis_result, inf_result = stored["descriptive"], stored["visual"], stored["inferential"]
+            else:
+                with instrumentation.span("univariate_column", column=col):
+                    desc_result, vis_result, inf_result = uni_analyser.analyze(self.dataset_pre[col], col_type, self.metadata[col], col)
+
             self.uni_desc_result[col] = desc_result
             self.uni_visual_result[col] = vis_result
             self.uni_inferential_result[col] = inf_result
-            
+            self.emit_column(col)
+
+        with instrumentation.span("render_wait"):
+            print("\nUni render timings: ", self.renderer.collect())
+        self.emit("renders_done", section="univariate")
+
+        if self.enable_critique:
+            uni_critique = UniCritique(self.stat_kb, self.critique_budget, parallel=True, escalate_semantic=CRITIQUE_ESCALATE, artifact_dir=self.run_dir)
+            for col, col_type in self.selected_data_types.items():
+                if col in self.reused_columns:
+                    continue
+                with instrumentation.span("critique", column=col):
+                    (self.uni_desc_result[col], self.uni_visual_result[col], self.uni_inferential_result[col]) = uni_critique.validate(
+                        self.dataset_pre[col], col_type, self.metadata[col], col,
+                        self.uni_desc_result[col], self.uni_visual_result[col], self.uni_inferential_result[col]
+                    )
+                self.emit_column(col)
+        for col in self.selected_data_types:
+            if self.column_store is not None and col not in self.reused_columns:
+                self.store_sections("univariate", self.unit_keys[col], self.uni_desc_result[col], self.uni_visual_result[col], self.uni_inferential_result[col])
         print("\nUNI DESC RESULT: ")
         for k, v in self.uni_desc_result.items():
             print(k, " : ", v)
@@ -109,14 +333,17 @@ class CoreAgent:
             
         print("\nEND UNIVARIATE\n")
 
+    @instrumentation.traced("bivariate")
     def bivariate_analysis(self):
         print("\nSTART BIVARIATE\n")
+        self.emit("stage", stage="bivariate")
         bi_selector = BivariateSelectorAgent(self.selected_data_types)
-        bi_analyser = BivariateAnalyzer(self.stat_kb)
-        # bi_critique = BiCritique(self.stat_kb)
+        bi_analyser = BivariateAnalyzer(self.stat_kb, self.renderer, artifact_dir=self.run_dir)
 
-        self.selected_pairs = bi_selector.select_bivariate_pairs(self.processed_file_path, self.data_context)
+        with instrumentation.span("bivariate_selection"):
+            self.selected_pairs = bi_selector.select_bivariate_pairs(self.dataset_pre, self.data_context, self.profile_pre)
         print("\nSelected pairs: ", self.selected_pairs)
+        self.emit("pairs_selected", pairs=self.selected_pairs)
         self.bi_desc_result = {}
         self.bi_visual_result = {}
         self.bi_inferential_result = {}
@@ -124,23 +351,47 @@ class CoreAgent:
         for temp in self.selected_pairs:
             col1 = temp['pair'][0]
             col2 = temp['pair'][1]
+            combine = col1 + "-" + col2
 
-            desc_result, vis_result, inf_result = bi_analyser.analyze(
-                self.dataset_pre[col1], self.selected_data_types[col1], col1, self.metadata[col1], 
-                self.dataset_pre[col2], self.selected_data_types[col2], col2, self.metadata[col2],
-            )
-
-            # desc_result, vis_result, inf_result = bi_critique.validate(
-            #     self.dataset_pre[col1], self.selected_data_types[col1], self.metadata[col1], col1,
-            #     self.dataset_pre[col2], self.selected_data_types[col2], self.metadata[col2], col2,
-            #     desc_result, vis_result, inf_result
-            # )
+            stored = self.reused_sections("bivariate", self.pair_key(col1, col2)) if self.column_store is not None else None
+            if stored is not None:
+                self.reused_pairs.append(combine)
+                desc_result, vis_result, inf_result = stored["descriptive"], stored["visual"], stored["inferential"]
+            else:
+                with instrumentation.span("bivariate_pair", pair=combine):
+                    desc_result, vis_result, inf_result = bi_analyser.analyze(
+                        self.dataset_pre[col1], self.selected_data_types[col1], col1, self.metadata[col1],
+                        self.dataset_pre[col2], self.selected_data_types[col2], col2, self.metadata[col2],
+                    )
 
-            combine = col1 + "-" + col2
             self.bi_desc_result[combine] = desc_result
             self.bi_visual_result[combine] = vis_result
             self.bi_inferential_result[combine] = inf_result
-        
+            self.emit_pair(combine)
+
+        with instrumentation.span("render_wait"):
+            print("\nBi render timings: ", self.renderer.collect())
+        self.emit("renders_done", section="bivariate")
+
+        if self.enable_critique:
+            bi_critique = BiCritique(self.stat_kb, self.critique_budget, parallel=True, escalate_semantic=CRITIQUE_ESCALATE, artifact_dir=self.run_dir)
+            for temp in self.selected_pairs:
+                col1, col2 = temp['pair']
+                combine = col1 + "-" + col2
+                if combine in self.reused_pairs:
+                    continue
+                with instrumentation.span("critique", pair=combine):
+                    (self.bi_desc_result[combine], self.bi_visual_result[combine], self.bi_inferential_result[combine]) = bi_critique.validate(
+                        self.dataset_pre[col1], self.selected_data_types[col1], self.metadata[col1], col1,
+                        self.dataset_pre[col2], self.selected_data_types[col2], self.metadata[col2], col2,
+                        self.bi_desc_result[combine], self.bi_visual_result[combine], self.bi_inferential_result[combine]
+                    )
+                self.emit_pair(combine)
+        for temp in self.selected_pairs:
+            col1, col2 = temp['pair']
+            combine = col1 + "-" + col2
+            if self.column_store is not None and combine not in self.reused_pairs:
+                self.store_sections("bivariate", self.pair_key(col1, col2), self.bi_desc_result[combine], self.bi_visual_result[combine], self.bi_inferential_result[combine])
         print("\nBI DESC RESULT: ")
         for k, v in self.bi_desc_result.items():
             print(k, " : ", v)
@@ -154,11 +405,33 @@ class CoreAgent:
 
         print("\nEND BIVARIATE\n")
 
+    def emit_column(self, col):
+        if self.on_event is None:
+            return
+        result_store.put_rows(self.store_path, [("column", col, {
+            "descriptive": self.uni_desc_result[col],
+            "visual": self.uni_visual_result[col],
+            "inferential": self.uni_inferential_result[col]
+        })])
+        self.emit("column", column=col)
+
+    def emit_pair(self, pair):
+        if self.on_event is None:
+            return
+        result_store.put_rows(self.store_path, [("pair", pair, {
+            "descriptive": self.bi_desc_result[pair],
+            "visual": self.bi_visual_result[pair],
+            "inferential": self.bi_inferential_result[pair]
+        })])
+        self.emit("pair", pair=pair)
+
+    @instrumentation.traced("combine_result")
     def combine_result(self):
         combined_dict = {
             "preprocessing": {
                 "outlier_result": self.outlier_result,
-                "distribution_result": self.distribution_result
+                "distribution_result": self.distribution_result,
+                "validation_result": self.preprocess_validation
             },
             "univariate": {
                 "descriptive": self.uni_desc_result,
@@ -169,9 +442,16 @@ class CoreAgent:
                 "descriptive": self.bi_desc_result,
                 "visual": self.bi_visual_result,
                 "inferential": self.bi_inferential_result
-            }
+            },
+            "incremental": {
+                "enabled": self.column_store is not None,
+                "reused_columns": self.reused_columns,
+                "reused_pairs": self.reused_pairs
+            },
+            # Spans finished so far; analyse_dataset and combine_result itself are still open.
+            "instrumentation": instrumentation.summarize(self.trace.spans)
         }
 
-        self.result_output_path = os.path.join(UPLOAD_DIR, f"{self.file_name}_result.json")
-        with open(self.result_output_path, "w", encoding="utf-8") as f:
-            json.dump(combined_dict, f, indent=2)
+        result_store.write(result_store.store_path(self.result_output_path), combined_dict)
+        # JSON export of the same result for the cache, job API and anything reading the file directly.
+        utils.dump_json(combined_dict, self.result_output_path, indent=2)
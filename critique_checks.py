@@ -0,0 +1,229 @@
+import os
+import time
+import numbers
+import threading
+from contextlib import contextmanager
+
+import plot_templates
+
+
+class CritiqueBudget:
+    """Retry and wall-time budget shared by every critique of one analysis.
+
+    Only time spent inside running() counts, so the analysis stages between
+    critiques do not use up the seconds.
+    """
+
+    def __init__(self, max_retries: int = 3, max_seconds: float = 60.0):
+        self.max_retries = max_retries
+        self.max_seconds = max_seconds
+        self.retries_used = 0
+        self.spent_seconds = 0.0
+        self.started = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def running(self):
+        self.started = time.monotonic()
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.spent_seconds += time.monotonic() - self.started
+                self.started = None
+
+    def elapsed(self):
+        started = self.started
+        return self.spent_seconds + (time.monotonic() - started if started is not None else 0.0)
+
+    def expired(self):
+        return self.elapsed() > self.max_seconds
+
+    def exhausted(self):
+        return self.retries_used >= self.max_retries or self.expired()
+
+    def consume(self):
+        """Reserve one re-run of an analyzer step. Returns False when the budget is spent."""
+        with self.lock:
+            if self.exhausted():
+                return False
+            self.retries_used += 1
+            return True
+
+
+def is_error_result(result):
+    return not isinstance(result, dict) or result.get("status") == "error"
+
+
+def structural_issue(section: str, result):
+    """Return a description of a structural problem in an analyzer result, or None.
+
+    These checks need no LLM: an analyzer step that errored or returned the
+    wrong shape is re-run straight away with the problem as feedback.
+    """
+    if is_error_result(result):
+        message = result.get("message") if isinstance(result, dict) else None
+        return message or f"The {section} step did not return a dictionary."
+
+    if section == "descriptive":
+        stats = result.get("statistics_results")
+        if not isinstance(stats, dict) or not stats:
+            return "Descriptive result must contain a non-empty 'statistics_results' dictionary."
+        for name, stat in stats.items():
+            if not isinstance(stat, dict) or "result_value" not in stat:
+                return f"Statistic '{name}' is missing 'result_value'."
+
+    elif section == "visualization":
+        selected = [v for k, v in result.items() if k.startswith("visualization_")]
+        if not selected:
+            return "No visualization was selected."
+        if len(selected) > 2:
+            return "More than two visualizations were selected."
+        for vis in selected:
+            if not isinstance(vis, dict) or not vis.get("name"):
+                return "Every visualization must have a 'name'."
+            if vis.get("render_error"):
+                return f"Visualization '{vis['name']}' failed to render: {vis['render_error']}"
+
+    elif section == "inferential":
+        if not result:
+            return "No inferential test was selected."
+        for name, test in result.items():
+            if not isinstance(test, dict):
+                return f"Inferential test '{name}' is not a dictionary."
+            if test.get("result") is None:
+                return f"Inferential test '{name}' has no executed result."
+            if not test.get("conclusion"):
+                return f"Inferential test '{name}' has no conclusion."
+
+    return None
+
+
+# ---------- rule-based validators ----------
+
+P_VALUE_NAMES = {"p value", "pvalue", "p"}
+NON_NEGATIVE_NAMES = {"variance", "std", "standard deviation", "iqr", "interquartile range", "range", "count", "chi2", "chi square"}
+STOP_WORDS = {"test", "tests", "the", "of", "or", "and", "via", "for", "check", "analysis", "both", "a"}
+
+
+def _words(name):
+    words = "".join(c if c.isalnum() else " " for c in str(name).lower()).split()
+    return [w for w in words if w not in STOP_WORDS]
+
+
+def _tokens(name):
+    return set(_words(name))
+
+
+def _normalized(name):
+    return " ".join(_words(name))
+
+
+def _matches_any(name, candidates):
+    tokens = _tokens(name)
+    return any(tokens & _tokens(candidate) for candidate in candidates)
+
+
+def _walk_numbers(value, keys=()):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _walk_numbers(item, keys + (str(key),))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _walk_numbers(item, keys)
+    elif isinstance(value, numbers.Real) and not isinstance(value, bool):
+        yield keys, float(value)
+
+
+def _stat_name(keys):
+    """The statistic a number belongs to: its own key, or the parent key for a 'result_value' leaf."""
+    if len(keys) > 1 and keys[-1] == "result_value":
+        return keys[-2]
+    return keys[-1]
+
+
+def numeric_issues(result, scalar_p_values=False):
+    """Range checks on every number in a result: p-values in [0, 1], spreads and counts >= 0.
+
+    Numbers are classified by the whole normalized statistic name, so 'std_error_ratio' is not
+    taken for 'std'. With scalar_p_values a bare number under a top-level key, such as an
+    inferential result keyed by test name, is checked as a p-value.
+    """
+    issues = []
+    for keys, value in _walk_numbers(result):
+        if not keys:
+            continue
+        path = ".".join(keys)
+        name = _normalized(_stat_name(keys))
+        if name in P_VALUE_NAMES or (scalar_p_values and len(keys) == 1):
+            if not 0.0 <= value <= 1.0:
+                issues.append(f"'{path}' is a p-value outside [0, 1]: {value}")
+        elif name in NON_NEGATIVE_NAMES and value < 0:
+            issues.append(f"'{path}' must not be negative: {value}")
+    return issues
+
+
+def descriptive_issues(result, knowledge):
+    computed = result.get("computed_results") or {}
+    priority = computed.get("priority", {}) if isinstance(computed, dict) else {}
+    issues = []
+    if computed:
+        missing = [test for test in knowledge.get("priority_tests", []) if not _matches_any(test, priority)]
+        if missing:
+            issues.append(f"Priority tests not calculated: {missing}")
+    return issues + numeric_issues(result)
+
+
+def visualization_issues(result, knowledge):
+    no_of_variable = knowledge.get("no_of_variable", "univariate")
+    issues = []
+    for key, vis in result.items():
+        if not key.startswith("visualization_"):
+            continue
+        if not plot_templates.has_template(vis.get("name", ""), no_of_variable):
+            issues.append(f"'{vis.get('name')}' is not one of the knowledge base visualizations.")
+        elif not vis.get("image_path") or not os.path.exists(vis["image_path"]):
+            issues.append(f"Image for '{vis.get('name')}' was not created.")
+    return issues
+
+
+def inferential_issues(result, knowledge):
+    available_tests = knowledge.get("inferential", {}).get("tests", [])
+    issues = []
+    for name in result:
+        if available_tests and not _matches_any(name, available_tests):
+            issues.append(f"Test '{name}' is not one of the knowledge base tests: {available_tests}")
+    return issues + numeric_issues({name: test.get("result") for name, test in result.items()}, scalar_p_values=True)
+
+
+SECTION_VALIDATORS = {
+    "descriptive": descriptive_issues,
+    "visualization": visualization_issues,
+    "inferential": inferential_issues,
+}
+
+
+def local_issues(section: str, result, knowledge: dict):
+    """All deterministic problems with one analyzer section; an empty list means it passed."""
+    issue = structural_issue(section, result)
+    if issue:
+        return [issue]
+    return SECTION_VALIDATORS[section](result, knowledge)
+
+
+def outlier_issues(outlier_result, n_rows):
+    if "error" in outlier_result:
+        return [outlier_result["error"]]
+    if "outlier_count" not in outlier_result:
+        return ["Outlier result is missing 'outlier_count'."]
+    issues = []
+    if outlier_result.get("invalid_indexes"):
+        issues.append(f"{outlier_result['invalid_indexes']} outlier indexes were not integers in [0, {n_rows}).")
+    if outlier_result.get("duplicate_indexes"):
+        issues.append(f"Outlier indexes contained {outlier_result['duplicate_indexes']} duplicates.")
+    if not 0 <= outlier_result["outlier_count"] <= n_rows:
+        issues.append(f"Outlier count must be in [0, {n_rows}].")
+    index_file = outlier_result.get("outlier_index_file")
+    if index_file and not os.path.exists(index_file):
+        issues.append(f"Outlier index file {index_file} is missing.")
+    return issues
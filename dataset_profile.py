@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+SAMPLE_VALUES = 10
+
+
+class DatasetProfile:
+    """Per-column facts gathered in one pass when a dataset is loaded.
+
+    Holds the null mask as a packed bitmap (one bit per cell), null counts,
+    distinct counts, min/max of numeric columns, dtypes and a few sample
+    values. Type detection, feature filtering, imputation, the preprocessing
+    critique and pair selection read these instead of rescanning columns.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = list(df.columns)
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self.n_rows = len(df)
+        null_mask = df.isna().to_numpy()
+        self.null_bits = np.packbits(null_mask, axis=0)
+        self.null_counts = null_mask.sum(axis=0)
+        self.stats = {column: self.column_stats(df[column], null_mask[:, i]) for i, column in enumerate(self.columns)}
+
+    def column_stats(self, data_column: pd.Series, null_mask: np.ndarray):
+        observed = data_column[~null_mask]
+        stats = {
+            "dtype": str(data_column.dtype),
+            "null_count": int(null_mask.sum()),
+            "non_null": int(len(observed)),
+            "distinct": int(observed.nunique()),
+            "min": None,
+            "max": None,
+            "sample_values": observed.head(SAMPLE_VALUES).tolist()
+        }
+        if len(observed) and pd.api.types.is_numeric_dtype(data_column) and not pd.api.types.is_bool_dtype(data_column):
+            stats["min"], stats["max"] = observed.min().item(), observed.max().item()
+        return stats
+
+    def __contains__(self, column):
+        return column in self.index
+
+    def __getitem__(self, column):
+        return self.stats[column]
+
+    def null_mask(self, column):
+        return np.unpackbits(self.null_bits[:, self.index[column]], count=self.n_rows).astype(bool)
+
+    def valid_mask(self, *columns):
+        """Rows where none of the columns is missing."""
+        return ~np.logical_or.reduce([self.null_mask(column) for column in columns])
+
+    def has_nulls(self, column):
+        return self.stats[column]["null_count"] > 0
+
+    def null_share(self, column):
+        return self.stats[column]["null_count"] / self.n_rows if self.n_rows else 0.0
+
+    def columns_within_null_share(self, max_share: float):
+        """Columns whose share of missing values is at most max_share."""
+        shares = self.null_counts / self.n_rows if self.n_rows else np.zeros(len(self.columns))
+        return {column for column, share in zip(self.columns, shares) if share <= max_share}
+
+    def observed(self, data_column: pd.Series):
+        """The non-missing values of a column of the profiled dataset, without another isna scan."""
+        return data_column[~self.null_mask(data_column.name)]
@@ -1,130 +1,238 @@
 import streamlit as st
-import pandas as pd
 import os
-from core_agent import CoreAgent
-from query_agent import QueryAgent
-import json
+import threading
+import job_queue
+import artifacts
+import result_store
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "20"))
 
-st.title("Automated Statistical Analysis using LLM")
 
-uploaded_file = st.file_uploader("Upload your CSV file", type="csv")
+@st.cache_resource
+def get_job_queue():
+    if job_queue.JOB_EMBEDDED_POOL:
+        job_queue.WorkerPool().start_background()
+    return job_queue.JobQueue()
 
-if uploaded_file:
-    upload_file_name = uploaded_file.name
-    file_path = os.path.join(UPLOAD_DIR, upload_file_name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
 
-    st.success("File uploaded successfully!")
+def show_visuals(label, visuals):
+    for vis_key, vis_info in visuals.items():
+        if isinstance(vis_info, dict):
+            image_path = vis_info.get("image_path")
+            if image_path and os.path.exists(image_path):
+                st.image(image_path, caption=f"{label} - {vis_info.get('name', vis_key)}")
 
-    data_context = st.text_input("Provide a data context or description of the dataset (optional):")
 
-    if st.button("Run Analysis"):
-        try:
-            st.write("Analyzing the CSV with Core Agent...")
-            core_agent = CoreAgent()
+def show_preprocessing(preprocessing):
+    st.subheader("Outlier Detection")
+    st.json(preprocessing["outlier_result"])
+    st.subheader("Distribution Comparison")
+    st.json(preprocessing["distribution_result"])
+    if "validation_result" in preprocessing:
+        st.subheader("Validation")
+        st.json(preprocessing["validation_result"])
 
-            if not data_context.strip():
-                data_context = "General statistical analysis"
 
-            combined_result_file, selected_columns, selected_pairs = core_agent.analyse_dataset(file_path, upload_file_name, data_context)
-            st.success("Analysis completed!")
-            st.session_state['combined_result_file'] = combined_result_file
-            st.session_state['selected_columns'] = selected_columns
-            st.session_state['selected_pairs'] = selected_pairs
-        except Exception as e:
-            st.error(f"Error analyzing file: {str(e)}")
-           
-if 'combined_result_file' in st.session_state:
-    with open(st.session_state['combined_result_file'], "r", encoding="utf-8") as f:
-        result_json = json.load(f)
+def show_sections(label, result):
+    # Descriptive Stats
+    if "descriptive" in result:
+        st.subheader("Descriptive Statistics")
+        st.json(result["descriptive"])
 
-    selected_columns = st.session_state.get('selected_columns', {})
-    selected_pairs = st.session_state.get('selected_pairs', [])
+    # Visualizations
+    if "visual" in result:
+        st.subheader("Visualizations")
+        show_visuals(label, result["visual"])
 
-    st.markdown("### 📊 Analysis Summary")
+    # Inferential Stats
+    if "inferential" in result:
+        st.subheader("Inferential Statistics")
+        st.json(result["inferential"])
 
-    with st.expander("🧹 Preprocessing Results"):
-        st.subheader("Outlier Detection")
-        st.json(result_json["preprocessing"]["outlier_result"])
-        st.subheader("Distribution Comparison")
-        st.json(result_json["preprocessing"]["distribution_result"])
-
-    with st.expander("📈 Univariate Analysis"):
-        univariate = result_json.get("univariate", {})
-        desc_results = univariate.get("descriptive", {})
-        visual_results = univariate.get("visual", {})
-        infer_results = univariate.get("inferential", {})
-
-        for col, col_type in selected_columns.items():
-            if col in desc_results or col in visual_results or col in infer_results:
-                with st.expander(f"📌 Column: {col}"):
-                    # Descriptive Stats
-                    if col in desc_results:
-                        st.subheader("Descriptive Statistics")
-                        st.json(desc_results[col])
-
-                    # Visualizations
-                    if col in visual_results:
-                        st.subheader("Visualizations")
-                        # st.json(visual_results[col])
-                        visuals = visual_results[col]
-                        for vis_key, vis_info in visuals.items():
-                            if isinstance(vis_info, dict):
-                                image_path = f"uploads/{col}_vis{vis_key[-1]}.png"
-                                if os.path.exists(image_path):
-                                    st.image(image_path, caption=f"{col} - {vis_info.get('name', vis_key)}")
-
-                    # Inferential Stats
-                    if col in infer_results:
-                        st.subheader("Inferential Statistics")
-                        st.json(infer_results[col])
-
-    with st.expander("📉 Bivariate Analysis"):
-        bivariate = result_json.get("bivariate", {})
-        bi_desc = bivariate.get("descriptive", {})
-        bi_vis = bivariate.get("visual", {})
-        bi_inf = bivariate.get("inferential", {})
-
-        for pair_obj in selected_pairs:
-            col1, col2 = pair_obj["pair"]
-            pair_key = f"{col1}-{col2}"
-
-            if pair_key in bi_desc or pair_key in bi_vis or pair_key in bi_inf:
-                with st.expander(f"🔗 Pair: {col1} vs {col2}"):
-                    # Descriptive Stats
-                    if pair_key in bi_desc:
-                        st.subheader("Descriptive Statistics")
-                        st.json(bi_desc[pair_key])
-
-                    # Visualizations
-                    if pair_key in bi_vis:
-                        st.subheader("Visualizations")
-                        # st.json(bi_vis[pair_key])
-                        visuals = bi_vis[pair_key]
-                        for vis_key, vis_info in visuals.items():
-                            if isinstance(vis_info, dict):
-                                image_path = f"uploads/bi_{col1}_{col2}_vis{vis_key[-1]}.png"
-                                if os.path.exists(image_path):
-                                    st.image(image_path, caption=f"{pair_key} - {vis_info.get('name', vis_key)}")
-
-                    # Inferential Stats
-                    if pair_key in bi_inf:
-                        st.subheader("Inferential Statistics")
-                        st.json(bi_inf[pair_key])
 
-# ================= QUERY SECTION =================
+def show_column(col, result):
+    if result:
+        with st.expander(f"📌 Column: {col}"):
+            show_sections(col, result)
+
+
+def show_pair(col1, col2, result):
+    if result:
+        with st.expander(f"🔗 Pair: {col1} vs {col2}"):
+            show_sections(f"{col1}-{col2}", result)
+
+
+@st.cache_data(max_entries=20)
+def load_names(store_path, kind):
+    return set(result_store.ResultStore(store_path).names(kind))
+
+
+@st.cache_data(max_entries=500)
+def load_unit(store_path, kind, name):
+    return result_store.ResultStore(store_path).get(kind, name, {})
+
+
+@st.cache_data(max_entries=20)
+def load_preprocessing(store_path):
+    return result_store.ResultStore(store_path).preprocessing()
+
+
+@st.cache_resource(max_entries=5)
+def get_query_agent(result_path):
+    # query_agent pulls in faiss and the embedding model, so it is imported on first use.
+    from query_agent import QueryAgent
+    return QueryAgent(file_path=result_path)
+
+
+def warm_up_query():
+    try:
+        import resources
+        resources.warm_up_query()
+    except Exception as e:
+        print(f"[WARN] Query agent warm-up failed: {e}")
+
+
+@st.cache_resource
+def start_warm_up():
+    """Load the query embedding model in the background, once per server process."""
+    thread = threading.Thread(target=warm_up_query, daemon=True)
+    thread.start()
+    return thread
+
+
+@st.fragment
+def show_results(store_path, selected_columns, selected_pairs):
+    """Paginated, filterable browser; a column or pair is loaded and rendered only while it is opened."""
+    st.markdown("### 📊 Analysis Summary")
+
+    if st.toggle("🧹 Preprocessing Results"):
+        show_preprocessing(load_preprocessing(store_path))
+
+    view = st.radio("Browse", ["📈 Univariate Analysis", "📉 Bivariate Analysis"], horizontal=True, label_visibility="collapsed")
+    if view == "📈 Univariate Analysis":
+        kind = "column"
+        items = [(col, f"📌 Column: {col}") for col in selected_columns]
+    else:
+        kind = "pair"
+        items = [(f"{col1}-{col2}", f"🔗 Pair: {col1} vs {col2}") for col1, col2 in (pair_obj["pair"] for pair_obj in selected_pairs)]
+    names = load_names(store_path, kind)
+    search = st.text_input("Filter by column name:", key=f"results_filter_{kind}").strip().lower()
+    items = [(name, label) for name, label in items if name in names and search in name.lower()]
+
+    pages = max(1, -(-len(items) // RESULTS_PAGE_SIZE))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"results_page_{kind}_{search}")
+    st.caption(f"{len(items)} {'columns' if kind == 'column' else 'pairs'}")
+    for name, label in items[(page - 1) * RESULTS_PAGE_SIZE:page * RESULTS_PAGE_SIZE]:
+        if st.toggle(label, key=f"results_open_{kind}_{name}"):
+            with st.container(border=True):
+                show_sections(name, load_unit(store_path, kind, name))
+
+
+@st.fragment
+def show_query(result_path):
+    """Query box in its own fragment, so answering a question does not rerun the results browser."""
     st.write("You can now query the analysis results:")
     query = st.text_input("Enter your query:")
 
     if query:
         try:
-            query_agent = QueryAgent(file_path=st.session_state['combined_result_file'])
-            answer = query_agent.get_answer(query)
+            answer = get_query_agent(result_path).get_answer(query)
             st.markdown("### Answer:")
             st.write(answer)
         except Exception as e:
             st.error(f"Error answering query: {str(e)}")
+
+
+@st.fragment(run_every=2)
+def show_progress(run_id):
+    """Poll the queued job and render columns and pairs as they finish."""
+    snapshot = get_job_queue().snapshot(run_id)
+    if snapshot is None:
+        st.warning("This analysis run is no longer available. Please run the analysis again.")
+        st.session_state.pop('run_id', None)
+        return
+
+    if snapshot["status"] == "done":
+        st.session_state['combined_result_file'] = snapshot["result_path"]
+        st.session_state['selected_columns'] = snapshot["selected_columns"]
+        st.session_state['selected_pairs'] = snapshot["selected_pairs"]
+        st.rerun()
+    if snapshot["status"] == "error":
+        st.error(f"Error analyzing file: {snapshot['error']}")
+        return
+    if snapshot["status"] == "cancelled":
+        st.warning("Analysis cancelled.")
+        return
+
+    if snapshot["status"] == "queued":
+        st.info("Waiting for a free worker...")
+    else:
+        st.progress(job_queue.progress(snapshot), text=f"Analyzing the CSV with Core Agent... ({snapshot['stage'] or 'starting'})")
+    if st.button("Cancel Analysis"):
+        get_job_queue().cancel(run_id)
+    if snapshot["preprocessing"]:
+        with st.expander("🧹 Preprocessing Results"):
+            show_preprocessing(snapshot["preprocessing"])
+    if snapshot["columns"]:
+        with st.expander(f"📈 Univariate Analysis ({len(snapshot['columns'])}/{len(snapshot['selected_columns'])} columns)", expanded=True):
+            for col, result in snapshot["columns"].items():
+                show_column(col, result)
+    if snapshot["pairs"]:
+        with st.expander(f"📉 Bivariate Analysis ({len(snapshot['pairs'])}/{len(snapshot['selected_pairs'])} pairs)", expanded=True):
+            for pair_obj in snapshot["selected_pairs"]:
+                col1, col2 = pair_obj["pair"]
+                show_pair(col1, col2, snapshot["pairs"].get(f"{col1}-{col2}"))
+
+
+st.title("Automated Statistical Analysis using LLM")
+
+# A refreshed page reattaches to its run through the ?run= query parameter.
+if 'run_id' not in st.session_state and "run" in st.query_params:
+    st.session_state['run_id'] = st.query_params["run"]
+
+uploaded_file = st.file_uploader("Upload your CSV file", type="csv")
+
+if uploaded_file:
+    upload_file_name = uploaded_file.name
+    st.success("File uploaded successfully!")
+
+    data_context = st.text_input("Provide a data context or description of the dataset (optional):")
+
+    if st.button("Run Analysis"):
+        if not data_context.strip():
+            data_context = "General statistical analysis"
+
+        # Each run gets its own directory, so same-named uploads and columns never collide.
+        run_id = artifacts.new_run_id()
+        file_path = os.path.join(artifacts.create_run_dir(run_id), artifacts.safe_name(upload_file_name))
+        with open(file_path, "wb") as f:
+            f.write(uploaded_file.getbuffer())
+
+        get_job_queue().submit(file_path, upload_file_name, data_context, job_id=run_id)
+        st.session_state['run_id'] = run_id
+        st.query_params["run"] = run_id
+        for key in ('combined_result_file', 'selected_columns', 'selected_pairs'):
+            st.session_state.pop(key, None)
+
+if 'run_id' in st.session_state and 'combined_result_file' not in st.session_state:
+    show_progress(st.session_state['run_id'])
+
+if 'combined_result_file' in st.session_state and not os.path.exists(st.session_state['combined_result_file']):
+    st.warning("The results of this run have been cleaned up. Please run the analysis again.")
+    st.session_state.pop('combined_result_file')
+    st.session_state.pop('run_id', None)
+    st.query_params.pop("run", None)
+
+if 'combined_result_file' in st.session_state:
+    # Sections are read from the run's result store one column or pair at a time.
+    store_path = result_store.open_store(st.session_state['combined_result_file']).path
+    show_results(store_path, st.session_state.get('selected_columns', {}), st.session_state.get('selected_pairs', []))
+
+# ================= QUERY SECTION =================
+    show_query(st.session_state['combined_result_file'])
+
+# Everything above is on screen; preload the heavy query dependencies now.
+if job_queue.WARMUP:
+    start_warm_up()
@@ -0,0 +1,205 @@
+"""Structured timing spans for analysis stages, LLM calls and generated-code execution.
+
+Spans are emitted to every registered sink (see add_sink) and to the
+collector of the current collect() block. Set INSTRUMENTATION_JSONL to
+append every span to a JSONL file.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+INSTRUMENTATION_JSONL = os.getenv("INSTRUMENTATION_JSONL")
+# Attributes that child spans inherit, so an LLM call knows which column or pair it belongs to.
+LABEL_KEYS = ("column", "pair")
+
+
+class Span:
+    def __init__(self, name: str, kind: str, attrs: dict, parent_id: str = None):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.error = None
+        self.start = time.time()
+        self.duration = None
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration = round(time.perf_counter() - self._started, 6)
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            **self.attrs
+        }
+
+
+class MemorySink:
+    """Keeps span records in a list."""
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def emit(self, record: dict):
+        with self.lock:
+            self.spans.append(record)
+
+
+class JsonlSink:
+    """Appends one JSON line per span to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def emit(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_sinks = []
+_collector = contextvars.ContextVar("instrumentation_collector", default=None)
+_current_span = contextvars.ContextVar("instrumentation_span", default=None)
+_labels = contextvars.ContextVar("instrumentation_labels", default={})
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def emit(record: dict):
+    collector = _collector.get()
+    for sink in list(_sinks) + ([collector] if collector else []):
+        try:
+            sink.emit(record)
+        except Exception as e:
+            print(f"[WARN] Instrumentation sink failed: {e}")
+
+
+@contextmanager
+def collect():
+    """Collect the spans emitted in this context (and in bind()-ed threads) into a MemorySink."""
+    sink = MemorySink()
+    token = _collector.set(sink)
+    try:
+        yield sink
+    finally:
+        _collector.reset(token)
+
+
+@contextmanager
+def span(name: str, kind: str = "stage", **attrs):
+    parent = _current_span.get()
+    labels = _labels.get()
+    current = Span(name, kind, {**labels, **attrs}, parent.span_id if parent else None)
+    span_token = _current_span.set(current)
+    label_token = _labels.set({**labels, **{k: attrs[k] for k in LABEL_KEYS if k in attrs}})
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _labels.reset(label_token)
+        _current_span.reset(span_token)
+        current.finish()
+        emit(current.to_dict())
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, e.g. a retry count from deep inside the LLM client."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def traced(name: str, kind: str = "stage"):
+    """Decorator that wraps every call of a function in a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(func):
+    """Carry the current collector, span and labels into a worker thread."""
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def run_code(code: str, globals_: dict, locals_: dict = None, **attrs):
+    """exec() generated code inside an 'exec' span."""
+    with span("exec", kind="exec", code_chars=len(code or ""), **attrs):
+        exec(code, globals_, locals_)
+
+
+# ---------- summaries ----------
+
+def _add(bucket: dict, record: dict):
+    bucket["count"] = bucket.get("count", 0) + 1
+    bucket["seconds"] = round(bucket.get("seconds", 0.0) + (record["duration"] or 0.0), 4)
+    if record.get("error"):
+        bucket["errors"] = bucket.get("errors", 0) + 1
+
+
+def summarize(records: list, slowest: int = 10):
+    """Aggregate span records: totals per stage, LLM and exec usage overall and per column/pair."""
+    stages, llm, execs, by_label = {}, {}, {}, {}
+    for record in records:
+        kind = record.get("kind")
+        if kind == "stage":
+            _add(stages.setdefault(record["name"], {}), record)
+            continue
+
+        bucket = llm if kind == "llm" else execs
+        _add(bucket, record)
+        if kind == "llm":
+            for key in ("prompt_chars", "response_chars", "retries"):
+                bucket[key] = bucket.get(key, 0) + (record.get(key) or 0)
+            bucket["cache_hits"] = bucket.get("cache_hits", 0) + bool(record.get("cache_hit"))
+
+        label = record.get("pair") or record.get("column")
+        if label:
+            _add(by_label.setdefault(label, {}).setdefault(kind, {}), record)
+
+    detail_spans = [r for r in records if r.get("kind") != "stage" and r.get("duration") is not None]
+    detail_spans.sort(key=lambda r: r["duration"], reverse=True)
+    return {
+        "stages": stages,
+        "llm": llm,
+        "exec": execs,
+        "by_label": by_label,
+        "slowest": [
+            {k: r.get(k) for k in ("name", "kind", "duration", "column", "pair", "model", "error") if r.get(k) is not None}
+            for r in detail_spans[:slowest]
+        ]
+    }
+
+
+if INSTRUMENTATION_JSONL:
+    add_sink(JsonlSink(INSTRUMENTATION_JSONL))
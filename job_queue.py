@@ -0,0 +1,355 @@
+"""SQLite-backed queue of analyse_dataset jobs served by a pool of worker processes.
+
+Run a standalone pool with:
+    python job_queue.py --workers 4
+
+The Streamlit frontend only submits jobs and polls their status and
+progress events, so a crashing analysis cannot take the UI down with it.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+import utils
+import artifacts
+import result_store
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("uploads", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+CANCEL_GRACE_SECONDS = float(os.getenv("JOB_CANCEL_GRACE_SECONDS", "10"))
+# Set to 0 when workers are served separately with `python job_queue.py`.
+JOB_EMBEDDED_POOL = os.getenv("JOB_EMBEDDED_POOL", "1") == "1"
+# Preload heavy dependencies in the background once the UI or a worker is up.
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    data_context TEXT,
+    stage TEXT,
+    worker_pid INTEGER,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    cancel_requested REAL,
+    result_path TEXT,
+    selected_columns TEXT,
+    selected_pairs TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+"""
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    def __init__(self, db_path: str = JOB_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        # Autocommit; multi-statement updates open their own transaction.
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ---------- client side ----------
+
+    def submit(self, file_path: str, file_name: str, data_context: str, job_id: str = None) -> str:
+        """Queue an analysis. The job id doubles as the run id of its artifact directory."""
+        job_id = job_id or uuid.uuid4().hex[:12]
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, file_path, file_name, data_context, created) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, file_path, file_name, data_context, time.time())
+            )
+        return job_id
+
+    def get_job(self, job_id: str):
+        with self.connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["selected_columns"] = json.loads(job["selected_columns"] or "{}")
+        job["selected_pairs"] = json.loads(job["selected_pairs"] or "[]")
+        return job
+
+    def list_jobs(self, limit: int = 50):
+        with self.connect() as conn:
+            rows = conn.execute("SELECT id, status, file_name, stage, created, finished FROM jobs ORDER BY created DESC LIMIT ?", (limit,))
+            return [dict(row) for row in rows]
+
+    def cancel(self, job_id: str):
+        """Cancel a queued job at once; a running job stops at its next progress event or is killed after a grace period."""
+        with self.connect() as conn:
+            if conn.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id)).rowcount:
+                artifacts.release_run_dir(artifacts.run_dir(job_id))
+            conn.execute("UPDATE jobs SET cancel_requested = ? WHERE id = ? AND status = 'running' AND cancel_requested IS NULL", (time.time(), job_id))
+
+    def events(self, job_id: str, after_seq: int = 0):
+        with self.connect() as conn:
+            rows = conn.execute("SELECT seq, type, payload, time FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq))
+            return [{"seq": row["seq"], "type": row["type"], "time": row["time"], **json.loads(row["payload"])} for row in rows]
+
+    def get_result(self, job_id: str):
+        job = self.get_job(job_id)
+        if not job or job["status"] != "done":
+            return None
+        with open(job["result_path"], "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def snapshot(self, job_id: str):
+        """Job status plus partial results: the progress events name the finished units, the run's result store holds them."""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        snapshot = {
+            "run_id": job_id,
+            "status": job["status"],
+            "stage": job["stage"],
+            "error": job["error"],
+            "result_path": job["result_path"],
+            "selected_columns": job["selected_columns"],
+            "selected_pairs": job["selected_pairs"],
+            "preprocessing": None,
+            "columns": {},
+            "pairs": {},
+        }
+        store_path, preprocessed, columns, pairs = None, False, {}, {}
+        for event in self.events(job_id):
+            if event["type"] == "started":
+                store_path = event["store_path"]
+            elif event["type"] == "columns_selected" and not snapshot["selected_columns"]:
+                snapshot["selected_columns"] = event["columns"]
+            elif event["type"] == "pairs_selected" and not snapshot["selected_pairs"]:
+                snapshot["selected_pairs"] = event["pairs"]
+            elif event["type"] == "preprocessing":
+                preprocessed = True
+            elif event["type"] == "column":
+                columns[event["column"]] = True
+            elif event["type"] == "pair":
+                pairs[event["pair"]] = True
+        if store_path and os.path.exists(store_path):
+            store = result_store.ResultStore(store_path)
+            snapshot["preprocessing"] = store.preprocessing() if preprocessed else None
+            snapshot["columns"] = store.get_many("column", columns)
+            snapshot["pairs"] = store.get_many("pair", pairs)
+        return snapshot
+
+    # ---------- worker side ----------
+
+    def claim(self, worker_pid: int):
+        """Atomically move the oldest queued job to running for this worker."""
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+                if row is not None:
+                    conn.execute("UPDATE jobs SET status = 'running', worker_pid = ?, started = ? WHERE id = ?", (worker_pid, time.time(), row["id"]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return dict(row) if row is not None else None
+
+    def add_event(self, job_id: str, event: dict):
+        """Store a CoreAgent progress event. Returns True when the job has been asked to cancel.
+
+        Events hold names only; column, pair and preprocessing results are read from the run's result store.
+        """
+        payload = {k: v for k, v in event.items() if k not in ("type", "time")}
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO job_events (job_id, type, payload, time) VALUES (?, ?, ?, ?)",
+                (job_id, event["type"], utils.to_json(payload), event.get("time", time.time()))
+            )
+            if event["type"] == "stage":
+                conn.execute("UPDATE jobs SET stage = ? WHERE id = ?", (event["stage"], job_id))
+            return conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()["cancel_requested"] is not None
+
+    def finish(self, job_id: str, status: str, **fields):
+        """Move a running job to done, error or cancelled, drop its progress events and release its run directory."""
+        fields = {k: json.dumps(v) if k in ("selected_columns", "selected_pairs") else v for k, v in fields.items()}
+        assignments = "".join(f", {k} = ?" for k in fields)
+        with self.connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET status = ?, finished = ?{assignments} WHERE id = ? AND status = 'running'",
+                (status, time.time(), *fields.values(), job_id)
+            )
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+        artifacts.release_run_dir(artifacts.run_dir(job_id))
+
+    def run_job(self, job: dict):
+        from core_agent import CoreAgent, AnalysisCancelled
+
+        def on_event(event):
+            if self.add_event(job["id"], event):
+                raise AnalysisCancelled()
+
+        agent = CoreAgent(on_event=on_event)
+        try:
+            result_path, selected_columns, selected_pairs = agent.analyse_dataset(job["file_path"], job["file_name"], job["data_context"], run_id=job["id"])
+            self.finish(job["id"], "done", result_path=result_path, selected_columns=selected_columns, selected_pairs=selected_pairs)
+        except AnalysisCancelled:
+            print(f"[JOB] {job['id']} cancelled")
+            self.finish(job["id"], "cancelled")
+        except Exception as e:
+            print(f"[JOB] {job['id']} failed: {e}")
+            self.finish(job["id"], "error", error=str(e))
+
+    def fail_orphaned(self):
+        """Mark running jobs whose worker process no longer exists as failed."""
+        with self.connect() as conn:
+            rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        for row in rows:
+            if not row["worker_pid"] or not pid_alive(row["worker_pid"]):
+                self.finish(row["id"], "error", error="Worker exited before the job finished.")
+
+    def overdue_cancellations(self, grace_seconds: float = CANCEL_GRACE_SECONDS):
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT id, worker_pid FROM jobs WHERE status = 'running' AND cancel_requested < ?",
+                (time.time() - grace_seconds,)
+            )
+            return [dict(row) for row in rows]
+
+
+def warm_up():
+    """Import the analysis stack and open the KB clients while the worker waits for its first job."""
+    start = time.time()
+    try:
+        import core_agent
+        import resources
+        resources.warm_up_analysis()
+        print(f"[JOB] Worker {os.getpid()} warmed up in {time.time() - start:.1f}s")
+    except Exception as e:
+        print(f"[WARN] Worker warm-up failed: {e}")
+
+
+def worker_main(db_path: str, poll_seconds: float = JOB_POLL_SECONDS):
+    queue = JobQueue(db_path)
+    print(f"[JOB] Worker {os.getpid()} started")
+    if WARMUP:
+        threading.Thread(target=warm_up, daemon=True).start()
+    while True:
+        job = queue.claim(os.getpid())
+        if job is None:
+            time.sleep(poll_seconds)
+            continue
+        print(f"[JOB] Worker {os.getpid()} running {job['id']}")
+        queue.run_job(job)
+
+
+class WorkerPool:
+    """Keeps a fixed number of worker processes alive and enforces cancellations."""
+
+    def __init__(self, workers: int = JOB_WORKERS, db_path: str = JOB_DB_PATH):
+        self.workers = workers
+        self.db_path = db_path
+        self.queue = JobQueue(db_path)
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = []
+
+    def spawn(self):
+        # Not daemonic: workers start their own plot-rendering processes.
+        process = self.context.Process(target=worker_main, args=(self.db_path,), name="analysis-worker")
+        process.start()
+        self.processes.append(process)
+
+    def replace(self, process):
+        self.processes.remove(process)
+        self.spawn()
+
+    def supervise_once(self):
+        for process in list(self.processes):
+            if not process.is_alive():
+                print(f"[JOB] Worker {process.pid} exited with code {process.exitcode}, restarting")
+                self.replace(process)
+        self.queue.fail_orphaned()
+
+        by_pid = {process.pid: process for process in self.processes}
+        for job in self.queue.overdue_cancellations():
+            process = by_pid.get(job["worker_pid"])
+            if process is None:
+                continue
+            print(f"[JOB] Killing worker {process.pid} to cancel {job['id']}")
+            process.terminate()
+            process.join(5)
+            self.queue.finish(job["id"], "cancelled")
+            self.replace(process)
+
+    def run_forever(self, interval: float = JOB_POLL_SECONDS):
+        for _ in range(self.workers - len(self.processes)):
+            self.spawn()
+        while True:
+            self.supervise_once()
+            time.sleep(interval)
+
+    def start_background(self):
+        thread = threading.Thread(target=self.run_forever, name="job-supervisor", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(5)
+
+
+def progress(snapshot: dict):
+    """Fraction of selected columns and pairs finished; pairs count once they are known."""
+    if snapshot["status"] == "done":
+        return 1.0
+    total = len(snapshot["selected_columns"]) + len(snapshot["selected_pairs"])
+    if not total:
+        return 0.0
+    return min(1.0, (len(snapshot["columns"]) + len(snapshot["pairs"])) / total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve queued analyse_dataset jobs.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    parser.add_argument("--db", default=JOB_DB_PATH)
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.workers, args.db)
+    try:
+        pool.run_forever()
+    except KeyboardInterrupt:
+        pool.shutdown()
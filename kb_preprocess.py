@@ -1,10 +1,13 @@
 import json
 import chromadb
 
+import prompt_fragments
+
 class PreprocessorKB:
     def __init__(self, persist_dir="./preprocess_kb_dir"):
         self.client = chromadb.PersistentClient(path=persist_dir)
         self.collection = self.client.get_or_create_collection(name="preprocess_kb_dir")
+        self.fragment_cache = {}
 
     def load_knowledge(self, json_path):
         with open(json_path, 'r') as file:
@@ -26,11 +29,16 @@ class PreprocessorKB:
             metadatas.append(metadata)
             ids.append(doc_id)
 
-        self.collection.add(
+        # Upsert so a reload over an existing collection replaces entries, and drop ids the file no longer has.
+        stale_ids = set(self.collection.get(include=[])["ids"]) - set(ids)
+        if stale_ids:
+            self.collection.delete(ids=list(stale_ids))
+        self.collection.upsert(
             documents=documents,
             metadatas=metadatas,
             ids=ids
         )
+        self.fragment_cache.clear()
 
     def search_knowledge(self, data_type):
         results = self.collection.query(
@@ -46,6 +54,13 @@ class PreprocessorKB:
         else:
             return "No relevant imputation method found for the given type."
 
+    def fragments(self, data_type):
+        """The matching entry with its prompt sections pre-rendered, or None. Cached until the KB is reloaded."""
+        if data_type not in self.fragment_cache:
+            doc = self.search_knowledge(data_type)
+            self.fragment_cache[data_type] = None if doc == "No relevant imputation method found for the given type." else prompt_fragments.KnowledgeFragments(json.loads(doc), prompt_fragments.PREPROCESS_SECTIONS)
+        return self.fragment_cache[data_type]
+
 
 # json_file_path = "/content/preprocess_kb.json"
 
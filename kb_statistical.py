@@ -1,10 +1,13 @@
 import json
 import chromadb
 
+import prompt_fragments
+
 class StatisticalKnowledgeBase:
     def __init__(self, persist_dir="stat_kb_dir"):
         self.client = chromadb.PersistentClient(path=persist_dir)
         self.collection = self.client.get_or_create_collection(name="stat_kb_dir")
+        self.fragment_cache = {}
 
     def load_knowledge(self, json_path):
         with open(json_path, 'r') as file:
@@ -25,11 +28,16 @@ class StatisticalKnowledgeBase:
             metadatas.append(metadata)
             ids.append(doc_id)
 
-        self.collection.add(
+        # Upsert so a reload over an existing collection replaces entries, and drop ids the file no longer has.
+        stale_ids = set(self.collection.get(include=[])["ids"]) - set(ids)
+        if stale_ids:
+            self.collection.delete(ids=list(stale_ids))
+        self.collection.upsert(
             documents=documents,
             metadatas=metadatas,
             ids=ids
         )
+        self.fragment_cache.clear()
 
     def search_knowledge(self, no_of_variable, var_type):
         results = self.collection.query(
@@ -48,3 +56,11 @@ class StatisticalKnowledgeBase:
         else:
             return "No relevant statistical test found."
 
+    def fragments(self, no_of_variable, var_type):
+        """The matching entry with its prompt sections pre-rendered, or None. Cached until the KB is reloaded."""
+        key = (no_of_variable, var_type)
+        if key not in self.fragment_cache:
+            doc = self.search_knowledge(no_of_variable, var_type)
+            self.fragment_cache[key] = None if doc == "No relevant statistical test found." else prompt_fragments.KnowledgeFragments(json.loads(doc))
+        return self.fragment_cache[key]
+
@@ -0,0 +1,195 @@
+import os
+import time
+import random
+import threading
+
+from dotenv import load_dotenv
+
+import instrumentation
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+MODEL_NAME = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH")
+API_KEY_VARS = ("GOOGLE_API_KEY1", "GOOGLE_API_KEY2", "GOOGLE_API_KEY3", "GOOGLE_API_KEY")
+REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "15"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+
+class LLMBackend:
+    """Interface behind every agent's model. Responses expose .text like Gemini responses."""
+
+    def generate_content(self, model_name: str, prompt, **kwargs):
+        raise NotImplementedError
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Callers reserve a token and sleep off any debt."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it."""
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class KeySlot:
+    """One API key with its own rate limit and a long-lived gRPC client."""
+
+    def __init__(self, api_key: str, requests_per_minute: float):
+        # The Google client libraries take seconds to import, so they are loaded with the first Gemini client.
+        from google.api_core import client_options as client_options_lib
+
+        self.api_key = api_key
+        self.bucket = TokenBucket(requests_per_minute)
+        self.client_options = client_options_lib.ClientOptions(api_key=api_key)
+        self.client = None
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def model(self, model_name: str):
+        import google.generativeai as genai
+        from google.ai import generativelanguage as glm
+
+        with self.lock:
+            if self.client is None:
+                self.client = glm.GenerativeServiceClient(client_options=self.client_options)
+            if model_name not in self.models:
+                model = genai.GenerativeModel(model_name)
+                model._client = self.client
+                self.models[model_name] = model
+            return self.models[model_name]
+
+
+class LLMClient(LLMBackend):
+    """Shared Gemini client: pooled connections, per-key rate limits and retries.
+
+    Requests go to the configured key with the most tokens left, so load is
+    spread across GOOGLE_API_KEY1/2/3. 429 and 5xx responses are retried with
+    jittered exponential backoff.
+    """
+
+    def __init__(self, api_keys=None, requests_per_minute: float = REQUESTS_PER_MINUTE, max_retries: int = MAX_RETRIES):
+        if api_keys is None:
+            api_keys = list(dict.fromkeys(os.getenv(var) for var in API_KEY_VARS if os.getenv(var)))
+        if not api_keys:
+            raise ValueError(f"No Gemini API key configured. Set one of {', '.join(API_KEY_VARS)}.")
+        from google.api_core import exceptions as api_exceptions
+
+        self.slots = [KeySlot(key, requests_per_minute) for key in api_keys]
+        self.max_retries = max_retries
+        # 429 (ResourceExhausted is a subclass) and every 5xx are worth retrying.
+        self.retryable_errors = (api_exceptions.TooManyRequests, api_exceptions.ServerError)
+
+    def pick_slot(self):
+        return max(self.slots, key=lambda slot: slot.bucket.available())
+
+    def backoff(self, attempt: int):
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def generate_content(self, model_name: str, prompt, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            slot = self.pick_slot()
+            slot.bucket.acquire()
+            try:
+                return slot.model(model_name).generate_content(prompt, **kwargs)
+            except self.retryable_errors as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"[LLM] {type(e).__name__}, retry {attempt + 1}/{self.max_retries}")
+                instrumentation.annotate(retries=attempt + 1)
+                time.sleep(self.backoff(attempt))
+
+
+class PooledModel:
+    """Drop-in for genai.GenerativeModel that routes calls through the shared backend."""
+
+    def __init__(self, model_name: str, client: LLMBackend = None):
+        self.model_name = model_name
+        self.client = client
+
+    def backend(self):
+        # Resolved per call so set_client() also reaches agents created earlier.
+        return self.client or get_client()
+
+    def span(self, prompt):
+        return instrumentation.span("generate_content", kind="llm", model=self.model_name,
+                                    prompt_chars=len(str(prompt)), retries=0, cache_hit=False)
+
+    def generate_content(self, prompt, **kwargs):
+        with self.span(prompt) as span:
+            response = self.backend().generate_content(self.model_name, prompt, **kwargs)
+            span.set(response_chars=response_chars(response))
+            return response
+
+
+def response_chars(response):
+    try:
+        return len(response.text)
+    except Exception:
+        # Blocked or empty Gemini responses raise on .text.
+        return 0
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_client(backend: str = LLM_BACKEND):
+    if backend == "offline":
+        from offline_llm import OfflineLLMBackend
+        client = OfflineLLMBackend()
+    elif backend == "gemini":
+        client = LLMClient()
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+
+    if LLM_RECORD_PATH:
+        from offline_llm import RecordingBackend
+        client = RecordingBackend(client, LLM_RECORD_PATH)
+    return client
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client()
+        return _client
+
+
+def set_client(client: LLMBackend):
+    """Replace the shared backend, e.g. with an OfflineLLMBackend for benchmarks."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_model(model_name: str = MODEL_NAME):
+    return PooledModel(model_name)
@@ -0,0 +1,136 @@
+"""Response schemas for the JSON prompts, and helpers to request and parse them.
+
+Prompts whose answer has a fixed shape have a dataclass here that is sent to
+Gemini as response_schema. Prompts keyed by column or test names cannot be
+described in Gemini's schema subset and only ask for application/json.
+Either way the reply goes through parse(), which repairs near-valid JSON
+locally so a formatting slip does not cost a critique retry.
+"""
+import os
+import typing
+import dataclasses
+from dataclasses import dataclass
+
+import utils
+
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "1") == "1"
+
+SCALAR_TYPES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+
+@dataclass
+class ColumnPlan:
+    column: str
+    description: str
+    keep: bool
+    outlier_method: str
+    imputation_method: str
+    reasoning: str
+
+
+@dataclass
+class PreprocessingPlan:
+    """Metadata, keep/drop decision and preprocessing methods for every column of a dataset."""
+    dataset_desc: str
+    columns: typing.List[ColumnPlan]
+
+
+@dataclass
+class Visualization:
+    name: str
+    reason: str
+
+
+@dataclass
+class VisualizationSelection:
+    visualization_1: Visualization
+    visualization_2: typing.Optional[Visualization] = None
+
+
+@dataclass
+class SelectedPair:
+    pair: typing.List[str]
+    reason: str
+
+
+@dataclass
+class PairSelection:
+    selected_pairs: typing.List[SelectedPair]
+
+
+def required_fields(cls):
+    return [
+        field.name for field in dataclasses.fields(cls)
+        if field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+    ]
+
+
+def schema_for(tp, enums=None, field=None):
+    """Gemini response_schema dict for a dataclass or type hint.
+
+    enums maps a string field name to its allowed values, e.g. the plot
+    templates that exist for a visualization name.
+    """
+    enums = enums or {}
+    origin = typing.get_origin(tp)
+    if origin is typing.Union:
+        inner = [arg for arg in typing.get_args(tp) if arg is not type(None)][0]
+        return {**schema_for(inner, enums, field), "nullable": True}
+    if origin is list:
+        return {"type": "ARRAY", "items": schema_for(typing.get_args(tp)[0], enums, field)}
+    if dataclasses.is_dataclass(tp):
+        hints = typing.get_type_hints(tp)
+        return {
+            "type": "OBJECT",
+            "properties": {f.name: schema_for(hints[f.name], enums, f.name) for f in dataclasses.fields(tp)},
+            "required": required_fields(tp)
+        }
+    schema = {"type": SCALAR_TYPES[tp]}
+    if tp is str and enums.get(field):
+        schema.update({"format": "enum", "enum": list(enums[field])})
+    return schema
+
+
+def json_config(schema=None, enums=None):
+    """generation_config for a JSON reply, constrained to schema when given; None when LLM_STRUCTURED_OUTPUT=0."""
+    if not LLM_STRUCTURED_OUTPUT:
+        return None
+    config = {"response_mime_type": "application/json"}
+    if schema is not None:
+        config["response_schema"] = schema_for(schema, enums)
+    return config
+
+
+def missing_fields(value, tp, path=""):
+    """Dotted paths of required fields that a parsed reply lacks."""
+    origin = typing.get_origin(tp)
+    if origin is typing.Union:
+        if value is None:
+            return []
+        tp = [arg for arg in typing.get_args(tp) if arg is not type(None)][0]
+        origin = typing.get_origin(tp)
+    if origin is list:
+        if not isinstance(value, list):
+            return [path or "<root>"]
+        item_type = typing.get_args(tp)[0]
+        return [missing for i, item in enumerate(value) for missing in missing_fields(item, item_type, f"{path}[{i}]")]
+    if not dataclasses.is_dataclass(tp):
+        return []
+    if not isinstance(value, dict):
+        return [path or "<root>"]
+    hints = typing.get_type_hints(tp)
+    missing = [f"{path}.{name}".lstrip(".") for name in required_fields(tp) if name not in value]
+    for field in dataclasses.fields(tp):
+        if field.name in value:
+            missing += missing_fields(value[field.name], hints[field.name], f"{path}.{field.name}".lstrip("."))
+    return missing
+
+
+def parse(text: str, schema=None):
+    """Parse a JSON reply, repairing near-valid JSON locally; raise ValueError if schema fields are missing."""
+    value = utils.parse_json_response(text)
+    if schema is not None:
+        missing = missing_fields(value, schema)
+        if missing:
+            raise ValueError(f"Response is missing required fields: {', '.join(missing)}")
+    return value
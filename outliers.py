@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Number of outlier row positions kept inline in the result JSON.
+OUTLIER_SAMPLE_SIZE = int(os.getenv("OUTLIER_SAMPLE_SIZE", "20"))
+# Index sets with at most this many contiguous runs are stored inline as
+# [start, stop) ranges; larger ones go to a .npy sidecar next to the result.
+OUTLIER_MAX_RUNS = int(os.getenv("OUTLIER_MAX_RUNS", "50"))
+
+
+def to_runs(positions: np.ndarray):
+    """Sorted unique positions as [start, stop) ranges."""
+    if not len(positions):
+        return []
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    starts = positions[np.r_[0, breaks]]
+    stops = positions[np.r_[breaks - 1, len(positions) - 1]] + 1
+    return [[int(start), int(stop)] for start, stop in zip(starts, stops)]
+
+
+def index_dtype(n_rows: int):
+    return np.uint32 if n_rows < 2 ** 32 else np.uint64
+
+
+def clean_positions(indexes, n_rows: int):
+    """Turn whatever the generated code produced into sorted unique row positions.
+
+    Returns (positions, invalid_count, duplicate_count). A boolean mask the
+    length of the column is read as a mask; anything that is not an integer
+    in [0, n_rows) is counted as invalid and dropped.
+    """
+    raw = np.asarray(indexes if indexes is not None else []).ravel()
+    if raw.dtype.kind == "b" and len(raw) == n_rows:
+        raw = np.flatnonzero(raw)
+    if raw.dtype.kind not in "iu":
+        raw = pd.to_numeric(pd.Series(raw, dtype=object), errors="coerce").to_numpy(dtype=float)
+        integral = np.isfinite(raw) & (raw == np.round(raw))
+    else:
+        integral = np.ones(len(raw), dtype=bool)
+    valid = integral & (raw >= 0) & (raw < n_rows)
+    positions = raw[valid].astype(np.int64)
+    unique = np.unique(positions)
+    return unique, int(len(raw) - valid.sum()), int(len(positions) - len(unique))
+
+
+def compact(indexes, n_rows: int, index_file: str):
+    """Counts, a bounded sample and either inline runs or a .npy sidecar for one column's outliers."""
+    positions, invalid_count, duplicate_count = clean_positions(indexes, n_rows)
+    result = {
+        "outlier_count": int(len(positions)),
+        "outlier_percent": round(100 * len(positions) / n_rows, 4) if n_rows else 0.0,
+        "outlier_sample": positions[:OUTLIER_SAMPLE_SIZE].tolist(),
+        "invalid_indexes": invalid_count,
+        "duplicate_indexes": duplicate_count
+    }
+    runs = to_runs(positions)
+    if len(runs) <= OUTLIER_MAX_RUNS:
+        result["outlier_runs"] = runs
+    else:
+        np.save(index_file, positions.astype(index_dtype(n_rows)))
+        result["outlier_index_file"] = index_file
+    return result
+
+
+def load_indexes(outlier_result: dict):
+    """Full array of outlier row positions for a compact outlier result."""
+    if "outlier_runs" in outlier_result:
+        runs = outlier_result["outlier_runs"]
+        if not runs:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.arange(start, stop, dtype=np.int64) for start, stop in runs])
+    if "outlier_index_file" in outlier_result:
+        return np.load(outlier_result["outlier_index_file"]).astype(np.int64)
+    return np.asarray(outlier_result.get("outlier_sample", []), dtype=np.int64)
+
@@ -0,0 +1,283 @@
+import numpy as np
+import pandas as pd
+
+MAX_BINS = 100
+KDE_POINTS = 200
+KDE_SAMPLE = 10000
+MAX_CATEGORIES = 30
+MAX_FLIERS = 50
+MAX_SERIES_POINTS = 2000
+MAX_LAGS = 40
+QQ_POINTS = 200
+
+
+def _numeric(data_column):
+    return pd.to_numeric(data_column, errors="coerce").dropna().to_numpy(dtype=float)
+
+
+def histogram(data_column, bins="auto"):
+    values = _numeric(data_column)
+    if values.size == 0:
+        return {"counts": [], "edges": []}
+    edges = np.histogram_bin_edges(values, bins=bins)
+    if len(edges) - 1 > MAX_BINS:
+        edges = np.histogram_bin_edges(values, bins=MAX_BINS)
+    counts, edges = np.histogram(values, bins=edges)
+    return {"counts": counts.tolist(), "edges": edges.tolist()}
+
+
+def kde_grid(data_column, points=KDE_POINTS):
+    from scipy.stats import gaussian_kde
+
+    values = _numeric(data_column)
+    if values.size < 2 or np.ptp(values) == 0:
+        return {"x": [], "density": []}
+    if values.size > KDE_SAMPLE:
+        values = np.random.default_rng(0).choice(values, KDE_SAMPLE, replace=False)
+    grid = np.linspace(values.min(), values.max(), points)
+    return {"x": grid.tolist(), "density": gaussian_kde(values)(grid).tolist()}
+
+
+def box_summary(data_column, label=""):
+    values = _numeric(data_column)
+    if values.size == 0:
+        return None
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    fliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    if fliers.size > MAX_FLIERS:
+        fliers = np.random.default_rng(0).choice(fliers, MAX_FLIERS, replace=False)
+    return {
+        "med": float(med),
+        "q1": float(q1),
+        "q3": float(q3),
+        "whislo": float(inside.min()) if inside.size else float(q1),
+        "whishi": float(inside.max()) if inside.size else float(q3),
+        "mean": float(values.mean()),
+        "fliers": fliers.tolist(),
+        "label": str(label)
+    }
+
+
+def value_counts(data_column, top=MAX_CATEGORIES):
+    counts = data_column.dropna().astype(str).value_counts()
+    if len(counts) > top:
+        counts = pd.concat([counts.iloc[:top], pd.Series({"Other": counts.iloc[top:].sum()})])
+    return {"labels": counts.index.tolist(), "counts": counts.astype(int).tolist()}
+
+
+def hist2d(data_column1, data_column2, bins=50):
+    x = pd.to_numeric(data_column1, errors="coerce")
+    y = pd.to_numeric(data_column2, errors="coerce")
+    mask = x.notna() & y.notna()
+    if not mask.any():
+        return {"counts": [], "x_edges": [], "y_edges": []}
+    counts, x_edges, y_edges = np.histogram2d(x[mask].to_numpy(), y[mask].to_numpy(), bins=bins)
+    return {"counts": counts.astype(int).tolist(), "x_edges": x_edges.tolist(), "y_edges": y_edges.tolist()}
+
+
+def _top_categories(data_column, top=MAX_CATEGORIES):
+    return data_column.dropna().astype(str).value_counts().index[:top]
+
+
+def grouped_box(numeric_column, category_column, top=MAX_CATEGORIES):
+    categories = category_column.astype(str).where(category_column.notna())
+    boxes = []
+    for cat in _top_categories(category_column, top):
+        box = box_summary(numeric_column[categories == cat], label=cat)
+        if box:
+            boxes.append(box)
+    return boxes
+
+
+def crosstab(data_column1, data_column2, top=MAX_CATEGORIES):
+    rows = data_column1.astype(str).where(data_column1.notna())
+    cols = data_column2.astype(str).where(data_column2.notna())
+    table = pd.crosstab(rows, cols)
+    table = table.loc[table.index.isin(_top_categories(data_column1, top)),
+                      table.columns.isin(_top_categories(data_column2, top))]
+    return {
+        "row_labels": table.index.tolist(),
+        "col_labels": table.columns.tolist(),
+        "counts": table.to_numpy().astype(int).tolist()
+    }
+
+
+def qq_quantiles(data_column, points=QQ_POINTS):
+    from scipy.stats import norm
+
+    values = _numeric(data_column)
+    if values.size < 2:
+        return {"theoretical": [], "sample": []}
+    probs = (np.arange(1, points + 1) - 0.5) / points
+    sample = np.quantile(values, probs)
+    theoretical = norm.ppf(probs, loc=values.mean(), scale=values.std(ddof=1) or 1.0)
+    return {"theoretical": theoretical.tolist(), "sample": sample.tolist()}
+
+
+def violin_stats(data_column, label="", points=KDE_POINTS):
+    """Matplotlib Axes.violin() statistics for one group."""
+    box = box_summary(data_column, label=label)
+    kde = kde_grid(data_column, points)
+    if box is None or not kde["x"]:
+        return None
+    values = _numeric(data_column)
+    return {
+        "coords": kde["x"], "vals": kde["density"], "mean": box["mean"], "median": box["med"],
+        "min": float(values.min()), "max": float(values.max()), "label": box["label"]
+    }
+
+
+def _stride(length, max_points=MAX_SERIES_POINTS):
+    return max(1, int(np.ceil(length / max_points)))
+
+
+def series(data_column, max_points=MAX_SERIES_POINTS):
+    values = pd.to_numeric(data_column, errors="coerce")
+    values = values.iloc[::_stride(len(values), max_points)]
+    return {"x": [str(i) for i in values.index], "y": values.where(values.notna(), None).tolist()}
+
+
+def acf_values(data_column, nlags=MAX_LAGS):
+    values = _numeric(data_column)
+    if values.size < 3:
+        return {"lags": [], "values": []}
+    values = values - values.mean()
+    denom = np.dot(values, values) or 1.0
+    nlags = min(nlags, values.size - 1)
+    acf = [float(np.dot(values[:values.size - lag], values[lag:]) / denom) for lag in range(nlags + 1)]
+    return {"lags": list(range(nlags + 1)), "values": acf, "conf": float(1.96 / np.sqrt(values.size))}
+
+
+def decomposition(data_column, period=12):
+    """Additive trend/seasonal/residual split using a centred moving average."""
+    values = pd.to_numeric(data_column, errors="coerce").reset_index(drop=True).interpolate().bfill().ffill()
+    if len(values) < 2 * period:
+        period = max(2, len(values) // 4)
+    trend = values.rolling(period, center=True, min_periods=1).mean()
+    detrended = values - trend
+    seasonal_means = detrended.groupby(np.arange(len(values)) % period).mean()
+    seasonal = seasonal_means.to_numpy()[np.arange(len(values)) % period]
+    resid = detrended - seasonal
+    step = _stride(len(values))
+    return {
+        "x": list(range(0, len(values), step)),
+        "observed": values.iloc[::step].tolist(),
+        "trend": trend.iloc[::step].tolist(),
+        "seasonal": seasonal[::step].tolist(),
+        "resid": resid.iloc[::step].tolist(),
+        "period": int(period),
+        "seasonal_means": seasonal_means.tolist()
+    }
+
+
+def scatter_sample(data_column1, data_column2, max_points=MAX_SERIES_POINTS):
+    x = pd.to_numeric(data_column1, errors="coerce")
+    y = pd.to_numeric(data_column2, errors="coerce")
+    mask = x.notna() & y.notna()
+    x, y = x[mask], y[mask]
+    if len(x) > max_points:
+        index = x.sample(n=max_points, random_state=0).sort_index().index
+        x, y = x.loc[index], y.loc[index]
+    return {"x": x.tolist(), "y": y.tolist(), "order": [int(i) for i in range(len(x))]}
+
+
+def regression(data_column1, data_column2):
+    x = pd.to_numeric(data_column1, errors="coerce")
+    y = pd.to_numeric(data_column2, errors="coerce")
+    mask = x.notna() & y.notna()
+    if mask.sum() < 2 or x[mask].nunique() < 2:
+        return {"slope": 0.0, "intercept": 0.0, "r": 0.0}
+    slope, intercept = np.polyfit(x[mask], y[mask], 1)
+    return {"slope": float(slope), "intercept": float(intercept), "r": float(np.corrcoef(x[mask], y[mask])[0, 1])}
+
+
+def cross_correlation(data_column1, data_column2, nlags=MAX_LAGS):
+    x = pd.to_numeric(data_column1, errors="coerce")
+    y = pd.to_numeric(data_column2, errors="coerce")
+    nlags = min(nlags, max(len(x) - 2, 0))
+    lags = list(range(-nlags, nlags + 1))
+    values = [x.corr(y.shift(lag)) for lag in lags]
+    return {"lags": lags, "values": [None if pd.isna(v) else float(v) for v in values]}
+
+
+def grouped_stats(numeric_column, category_column, top=MAX_CATEGORIES, ordered=False):
+    categories = category_column.astype(str).where(category_column.notna())
+    grouped = pd.to_numeric(numeric_column, errors="coerce").groupby(categories).agg(["mean", "std", "count"])
+    grouped = grouped.loc[grouped.index.isin(_top_categories(category_column, top))]
+    if ordered:
+        grouped = grouped.sort_index()
+    return {
+        "labels": grouped.index.tolist(),
+        "mean": grouped["mean"].tolist(),
+        "std": grouped["std"].fillna(0).tolist(),
+        "count": grouped["count"].astype(int).tolist()
+    }
+
+
+def _is_numeric_type(var_type):
+    return "numerical" in var_type
+
+
+def _is_time_series(var_type):
+    return "time series" in var_type
+
+
+def prepare_univariate(data_column, var_type):
+    if _is_time_series(var_type):
+        return {
+            "series": series(data_column),
+            "acf": acf_values(data_column),
+            "decomposition": decomposition(data_column),
+            "histogram": histogram(data_column)
+        }
+    if _is_numeric_type(var_type):
+        plot_data = {
+            "histogram": histogram(data_column),
+            "kde": kde_grid(data_column),
+            "box": box_summary(data_column, label=data_column.name),
+            "violin": violin_stats(data_column, label=data_column.name),
+            "qq": qq_quantiles(data_column)
+        }
+        if "discrete" in var_type:
+            plot_data["value_counts"] = value_counts(data_column)
+        return plot_data
+    plot_data = {"value_counts": value_counts(data_column)}
+    if "ordinal" in var_type:
+        ordered = data_column.dropna().astype(str).value_counts().sort_index()
+        plot_data["ordered_counts"] = {"labels": ordered.index.tolist()[:MAX_CATEGORIES], "counts": ordered.astype(int).tolist()[:MAX_CATEGORIES]}
+    return plot_data
+
+
+def prepare_bivariate(data_column1, var_type1, data_column2, var_type2):
+    numeric1, numeric2 = _is_numeric_type(var_type1), _is_numeric_type(var_type2)
+    if numeric1 and numeric2:
+        plot_data = {
+            "hist2d": hist2d(data_column1, data_column2),
+            "grouped_box": [box_summary(data_column1, label=data_column1.name), box_summary(data_column2, label=data_column2.name)],
+            "scatter_sample": scatter_sample(data_column1, data_column2),
+            "regression": regression(data_column1, data_column2),
+            "labels": [str(data_column1.name), str(data_column2.name)]
+        }
+        if _is_time_series(var_type1) or _is_time_series(var_type2):
+            first, second = series(data_column1), series(data_column2)
+            plot_data["series"] = {"x": first["x"], "y1": first["y"], "y2": second["y"]}
+            plot_data["ccf"] = cross_correlation(data_column1, data_column2)
+        if "discrete" in var_type1 and "discrete" in var_type2:
+            plot_data["crosstab"] = crosstab(data_column1, data_column2)
+        return plot_data
+    if numeric1 != numeric2:
+        numeric_column, category_column = (data_column1, data_column2) if numeric1 else (data_column2, data_column1)
+        ordered = "ordinal" in var_type1 or "ordinal" in var_type2
+        categories = category_column.astype(str).where(category_column.notna())
+        violins = [violin_stats(numeric_column[categories == cat], label=cat) for cat in _top_categories(category_column, 8)]
+        return {
+            "grouped_box": grouped_box(numeric_column, category_column),
+            "grouped_violin": [v for v in violins if v],
+            "grouped_stats": grouped_stats(numeric_column, category_column, ordered=ordered),
+            "value_counts": value_counts(category_column),
+            "labels": [str(numeric_column.name), str(category_column.name)],
+            "ordered": ordered
+        }
+    return {"crosstab": crosstab(data_column1, data_column2), "labels": [str(data_column1.name), str(data_column2.name)]}
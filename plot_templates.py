@@ -0,0 +1,442 @@
+import numpy as np
+
+# Native plot templates for every visualization name in uni_bi_kb.json.
+# Each template draws on a matplotlib Axes from the aggregates built by
+# plot_data.prepare_univariate / prepare_bivariate, never from raw rows.
+
+
+def normalize_name(name):
+    return " ".join(str(name).lower().replace("_", " ").split())
+
+
+def _bars(ax, counts, horizontal=False):
+    labels = [str(l) for l in counts["labels"]]
+    if horizontal:
+        ax.barh(labels, counts["counts"])
+    else:
+        ax.bar(labels, counts["counts"])
+        ax.tick_params(axis="x", labelrotation=45)
+
+
+def _sorted_boxes(boxes):
+    return sorted(boxes, key=lambda b: b["label"])
+
+
+# ---------- univariate ----------
+
+def histogram(ax, plot_data, title):
+    hist = plot_data["histogram"]
+    ax.stairs(hist["counts"], hist["edges"], fill=True)
+    ax.set_ylabel("Frequency")
+
+
+def box_plot(ax, plot_data, title):
+    ax.bxp([plot_data["box"]], showmeans=True)
+
+
+def density_plot(ax, plot_data, title):
+    kde = plot_data["kde"]
+    ax.plot(kde["x"], kde["density"])
+    ax.fill_between(kde["x"], kde["density"], alpha=0.3)
+    ax.set_ylabel("Density")
+
+
+def violin_plot(ax, plot_data, title):
+    ax.violin([plot_data["violin"]], showmeans=True, showmedians=True)
+    ax.set_xticks([1], [plot_data["violin"]["label"]])
+
+
+def qq_plot(ax, plot_data, title):
+    qq = plot_data["qq"]
+    ax.scatter(qq["theoretical"], qq["sample"], s=8)
+    if qq["theoretical"]:
+        lims = [min(qq["theoretical"][0], qq["sample"][0]), max(qq["theoretical"][-1], qq["sample"][-1])]
+        ax.plot(lims, lims, color="red")
+    ax.set_xlabel("Theoretical quantiles")
+    ax.set_ylabel("Sample quantiles")
+
+
+def bar_chart(ax, plot_data, title):
+    _bars(ax, plot_data["value_counts"])
+    ax.set_ylabel("Count")
+
+
+def ordered_bar_chart(ax, plot_data, title):
+    _bars(ax, plot_data.get("ordered_counts", plot_data["value_counts"]))
+    ax.set_ylabel("Count")
+
+
+def dot_plot(ax, plot_data, title):
+    counts = plot_data["value_counts"]
+    ax.plot(counts["counts"], [str(l) for l in counts["labels"]], "o")
+    ax.set_xlabel("Count")
+
+
+def pie_chart(ax, plot_data, title):
+    counts = plot_data["value_counts"]
+    ax.pie(counts["counts"], labels=counts["labels"], autopct="%1.1f%%")
+    ax.axis("equal")
+
+
+def frequency_table(ax, plot_data, title):
+    counts = plot_data["value_counts"]
+    total = sum(counts["counts"]) or 1
+    rows = [[label, count, f"{100 * count / total:.1f}%"] for label, count in zip(counts["labels"], counts["counts"])]
+    ax.axis("off")
+    ax.table(cellText=rows, colLabels=["Value", "Count", "Percent"], loc="center")
+
+
+def time_series_plot(ax, plot_data, title):
+    data = plot_data["series"]
+    ax.plot(range(len(data["y"])), data["y"])
+    ax.set_xlabel("Observation")
+
+
+def acf_plot(ax, plot_data, title):
+    acf = plot_data["acf"]
+    ax.stem(acf["lags"], acf["values"])
+    if acf["values"]:
+        ax.axhspan(-acf["conf"], acf["conf"], alpha=0.2)
+    ax.set_xlabel("Lag")
+    ax.set_ylabel("Autocorrelation")
+
+
+def decomposition_plot(ax, plot_data, title):
+    dec = plot_data["decomposition"]
+    for key in ("observed", "trend", "seasonal", "resid"):
+        ax.plot(dec["x"], dec[key], label=key)
+    ax.legend()
+
+
+def seasonal_subseries_plot(ax, plot_data, title):
+    dec = plot_data["decomposition"]
+    ax.bar(range(dec["period"]), dec["seasonal_means"])
+    ax.set_xlabel(f"Position in period ({dec['period']})")
+    ax.set_ylabel("Mean seasonal effect")
+
+
+# ---------- bivariate ----------
+
+def _pair_labels(ax, plot_data):
+    labels = plot_data.get("labels", ["", ""])
+    ax.set_xlabel(labels[0])
+    ax.set_ylabel(labels[1])
+
+
+def scatter_plot(ax, plot_data, title):
+    if "scatter_sample" not in plot_data:
+        return grouped_box_plot(ax, plot_data, title)
+    sample = plot_data["scatter_sample"]
+    ax.scatter(sample["x"], sample["y"], s=8, alpha=0.5)
+    _pair_labels(ax, plot_data)
+
+
+def scatter_with_regression(ax, plot_data, title):
+    scatter_plot(ax, plot_data, title)
+    reg = plot_data["regression"]
+    xs = np.array([min(plot_data["scatter_sample"]["x"] or [0]), max(plot_data["scatter_sample"]["x"] or [0])])
+    ax.plot(xs, reg["slope"] * xs + reg["intercept"], color="red", label=f"r = {reg['r']:.2f}")
+    ax.legend()
+
+
+def correlation_heatmap(ax, plot_data, title):
+    r = plot_data["regression"]["r"]
+    matrix = np.array([[1.0, r], [r, 1.0]])
+    image = ax.imshow(matrix, vmin=-1, vmax=1, cmap="coolwarm")
+    labels = plot_data.get("labels", ["x", "y"])
+    ax.set_xticks([0, 1], labels)
+    ax.set_yticks([0, 1], labels)
+    for i in range(2):
+        for j in range(2):
+            ax.text(j, i, f"{matrix[i, j]:.2f}", ha="center", va="center")
+    ax.figure.colorbar(image, ax=ax)
+
+
+def residual_plot(ax, plot_data, title):
+    sample, reg = plot_data["scatter_sample"], plot_data["regression"]
+    x = np.array(sample["x"])
+    fitted = reg["slope"] * x + reg["intercept"]
+    ax.scatter(fitted, np.array(sample["y"]) - fitted, s=8, alpha=0.5)
+    ax.axhline(0, color="red")
+    ax.set_xlabel("Fitted values")
+    ax.set_ylabel("Residuals")
+
+
+def hist2d_plot(ax, plot_data, title):
+    hist = plot_data["hist2d"]
+    mesh = ax.pcolormesh(hist["x_edges"], hist["y_edges"], np.array(hist["counts"]).T)
+    ax.figure.colorbar(mesh, ax=ax)
+    _pair_labels(ax, plot_data)
+
+
+def jitter_scatter(ax, plot_data, title):
+    sample = plot_data["scatter_sample"]
+    rng = np.random.default_rng(0)
+    x = np.array(sample["x"]) + rng.uniform(-0.2, 0.2, len(sample["x"]))
+    y = np.array(sample["y"]) + rng.uniform(-0.2, 0.2, len(sample["y"]))
+    ax.scatter(x, y, s=8, alpha=0.5)
+    _pair_labels(ax, plot_data)
+
+
+def bubble_plot(ax, plot_data, title):
+    table = plot_data["crosstab"]
+    counts = np.array(table["counts"], dtype=float)
+    if counts.size == 0:
+        return
+    rows, cols = np.nonzero(counts)
+    sizes = 1000 * counts[rows, cols] / counts.max()
+    ax.scatter([table["col_labels"][c] for c in cols], [table["row_labels"][r] for r in rows], s=sizes, alpha=0.5)
+    _pair_labels(ax, {"labels": plot_data.get("labels", ["", ""])[::-1]})
+
+
+def crosstab_heatmap(ax, plot_data, title):
+    if "crosstab" not in plot_data:
+        return hist2d_plot(ax, plot_data, title)
+    table = plot_data["crosstab"]
+    image = ax.imshow(np.array(table["counts"]), aspect="auto", cmap="Blues")
+    ax.set_xticks(range(len(table["col_labels"])), table["col_labels"], rotation=45)
+    ax.set_yticks(range(len(table["row_labels"])), table["row_labels"])
+    ax.figure.colorbar(image, ax=ax)
+
+
+def contingency_table(ax, plot_data, title):
+    table = plot_data["crosstab"]
+    ax.axis("off")
+    ax.table(cellText=table["counts"], rowLabels=table["row_labels"], colLabels=table["col_labels"], loc="center")
+
+
+def mosaic_plot(ax, plot_data, title):
+    from matplotlib.patches import Rectangle
+
+    table = plot_data["crosstab"]
+    counts = np.array(table["counts"], dtype=float)
+    total = counts.sum() or 1.0
+    x = 0.0
+    for i, row_label in enumerate(table["row_labels"]):
+        width = counts[i].sum() / total
+        y = 0.0
+        for j, col_label in enumerate(table["col_labels"]):
+            height = counts[i, j] / (counts[i].sum() or 1.0)
+            ax.add_patch(Rectangle((x, y), width, height, facecolor=f"C{j}", edgecolor="white",
+                                   label=col_label if i == 0 else None))
+            y += height
+        ax.text(x + width / 2, -0.05, str(row_label), ha="center", va="top")
+        x += width
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.set_xticks([])
+    ax.legend(loc="upper right")
+
+
+def grouped_box_plot(ax, plot_data, title):
+    boxes = plot_data["grouped_box"]
+    if plot_data.get("ordered"):
+        boxes = _sorted_boxes(boxes)
+    ax.bxp(boxes, showmeans=True)
+    ax.tick_params(axis="x", labelrotation=45)
+
+
+def ordered_box_plot(ax, plot_data, title):
+    ax.bxp(_sorted_boxes(plot_data["grouped_box"]), showmeans=True)
+    ax.tick_params(axis="x", labelrotation=45)
+
+
+def grouped_violin_plot(ax, plot_data, title):
+    violins = plot_data["grouped_violin"]
+    ax.violin(violins, showmeans=True, showmedians=True)
+    ax.set_xticks(range(1, len(violins) + 1), [v["label"] for v in violins], rotation=45)
+
+
+def grouped_density_plot(ax, plot_data, title):
+    for violin in plot_data["grouped_violin"]:
+        ax.plot(violin["coords"], violin["vals"], label=violin["label"])
+    ax.set_ylabel("Density")
+    ax.legend()
+
+
+def error_bar_chart(ax, plot_data, title):
+    group = plot_data["grouped_stats"]
+    ax.bar(group["labels"], group["mean"], yerr=group["std"], capsize=4)
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.set_ylabel(f"Mean {plot_data.get('labels', [''])[0]}")
+
+
+def group_line_plot(ax, plot_data, title):
+    group = plot_data["grouped_stats"]
+    ax.plot(group["labels"], group["mean"], marker="o")
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.set_ylabel(f"Mean {plot_data.get('labels', [''])[0]}")
+
+
+def ordinal_jitter_scatter(ax, plot_data, title):
+    boxes = _sorted_boxes(plot_data["grouped_box"])
+    rng = np.random.default_rng(0)
+    for position, box in enumerate(boxes, start=1):
+        values = [box["whislo"], box["q1"], box["med"], box["q3"], box["whishi"]] + box["fliers"]
+        ax.scatter(position + rng.uniform(-0.15, 0.15, len(values)), values, s=10, alpha=0.6)
+    ax.set_xticks(range(1, len(boxes) + 1), [b["label"] for b in boxes], rotation=45)
+
+
+def overlaid_time_series(ax, plot_data, title):
+    data = plot_data["series"]
+    labels = plot_data.get("labels", ["series 1", "series 2"])
+    ax.plot(range(len(data["y1"])), data["y1"], label=labels[0])
+    ax.plot(range(len(data["y2"])), data["y2"], label=labels[1])
+    ax.legend()
+
+
+def cross_correlation_plot(ax, plot_data, title):
+    ccf = plot_data["ccf"]
+    ax.stem(ccf["lags"], [v if v is not None else 0 for v in ccf["values"]])
+    ax.set_xlabel("Lag")
+    ax.set_ylabel("Cross-correlation")
+
+
+def lagged_correlation_heatmap(ax, plot_data, title):
+    ccf = plot_data["ccf"]
+    values = np.array([[v if v is not None else np.nan for v in ccf["values"]]])
+    image = ax.imshow(values, aspect="auto", cmap="coolwarm", vmin=-1, vmax=1,
+                      extent=[ccf["lags"][0] - 0.5, ccf["lags"][-1] + 0.5, 0, 1] if ccf["lags"] else None)
+    ax.set_yticks([])
+    ax.set_xlabel("Lag")
+    ax.figure.colorbar(image, ax=ax)
+
+
+def lagged_scatter(ax, plot_data, title):
+    ccf = plot_data["ccf"]
+    values = [abs(v) if v is not None else 0 for v in ccf["values"]]
+    best_lag = ccf["lags"][int(np.argmax(values))] if values else 0
+    y1, y2 = np.array(plot_data["series"]["y1"], dtype=float), np.array(plot_data["series"]["y2"], dtype=float)
+    if best_lag > 0:
+        y1, y2 = y1[:-best_lag], y2[best_lag:]
+    elif best_lag < 0:
+        y1, y2 = y1[-best_lag:], y2[:best_lag]
+    ax.scatter(y1, y2, s=8, alpha=0.5)
+    ax.set_title(f"{title} (lag {best_lag})")
+
+
+def time_colored_scatter(ax, plot_data, title):
+    sample = plot_data["scatter_sample"]
+    points = ax.scatter(sample["x"], sample["y"], c=sample["order"], cmap="viridis", s=8)
+    ax.figure.colorbar(points, ax=ax, label="Time order")
+    _pair_labels(ax, plot_data)
+
+
+def bivariate_time_series_plot(ax, plot_data, title):
+    if "series" in plot_data:
+        return overlaid_time_series(ax, plot_data, title)
+    return scatter_plot(ax, plot_data, title)
+
+
+UNIVARIATE_TEMPLATES = {
+    "histogram": histogram,
+    "box plot": box_plot,
+    "density plot": density_plot,
+    "violin plot": violin_plot,
+    "q-q plot": qq_plot,
+    "bar chart": bar_chart,
+    "dot plot": dot_plot,
+    "pie chart": pie_chart,
+    "frequency table": frequency_table,
+    "ordered bar chart": ordered_bar_chart,
+    "time series plot": time_series_plot,
+    "acf plot": acf_plot,
+    "decomposition plot": decomposition_plot,
+    "seasonal subseries plot": seasonal_subseries_plot,
+}
+
+BIVARIATE_TEMPLATES = {
+    "overlaid time series plot": overlaid_time_series,
+    "cross-correlation plot": cross_correlation_plot,
+    "scatter plot with lagging adjustments": lagged_scatter,
+    "heatmap of lagged correlations": lagged_correlation_heatmap,
+    "scatter plot": scatter_plot,
+    "scatter plot with regression line": scatter_with_regression,
+    "correlation matrix heatmap": correlation_heatmap,
+    "residual plot": residual_plot,
+    "box plot by groups": grouped_box_plot,
+    "box plot": grouped_box_plot,
+    "violin plot": grouped_violin_plot,
+    "density plot": grouped_density_plot,
+    "bar chart with error bars": error_bar_chart,
+    "ordered box plots": ordered_box_plot,
+    "line plot": group_line_plot,
+    "2x2 contingency table": contingency_table,
+    "mosaic plot": mosaic_plot,
+    "box plot with ordered categories": ordered_box_plot,
+    "scatter plot with jittered ordinal": ordinal_jitter_scatter,
+    "trend line plot": group_line_plot,
+    "scatter plot with jittering": jitter_scatter,
+    "bubble plot": bubble_plot,
+    "heatmap of joint frequencies": crosstab_heatmap,
+    "time series plot": bivariate_time_series_plot,
+    "scatter plot with time coloring": time_colored_scatter,
+    "hexbin plot": hist2d_plot,
+}
+
+
+def get_templates(no_of_variable):
+    return UNIVARIATE_TEMPLATES if no_of_variable == "univariate" else BIVARIATE_TEMPLATES
+
+
+def available_templates(knowledge):
+    """Template names for the visualization options listed in a KB entry."""
+    templates = get_templates(knowledge.get("no_of_variable", "univariate"))
+    options = knowledge.get("visualization", {})
+    return [name for name in options if normalize_name(name) in templates]
+
+
+def has_template(name, no_of_variable):
+    return normalize_name(name) in get_templates(no_of_variable)
+
+
+def rule_based_selection(knowledge, plot_data, max_plots=2):
+    """Pick templates from the KB options using the precomputed plot data.
+
+    Outliers in the box summary promote the box plot and a near-symmetric
+    box promotes the histogram; otherwise the KB order is kept.
+    """
+    names = available_templates(knowledge)
+    box = plot_data.get("box")
+    preferred = []
+    if box:
+        spread = (box["q3"] - box["q1"]) or 1.0
+        skewed = abs((box["mean"] - box["med"]) / spread) > 0.25
+        if box["fliers"] or skewed:
+            preferred = ["box plot", "violin plot"]
+        else:
+            preferred = ["histogram", "density plot"]
+    names.sort(key=lambda n: preferred.index(normalize_name(n)) if normalize_name(n) in preferred else len(preferred))
+    return names[:max_plots]
+
+
+def resolve_selection(suggestions, knowledge, plot_data, max_plots=2):
+    """Keep the suggested visualizations that have a template, falling back to the rule."""
+    no_of_variable = knowledge.get("no_of_variable", "univariate")
+    selected = [
+        vis for key, vis in sorted(suggestions.items())
+        if isinstance(vis, dict) and has_template(vis.get("name", ""), no_of_variable)
+    ][:max_plots]
+    if not selected:
+        selected = [
+            {"name": name, "reason": "Selected by rule from the knowledge base options and the precomputed plot data"}
+            for name in rule_based_selection(knowledge, plot_data, max_plots)
+        ]
+    return {f"visualization_{i}": vis for i, vis in enumerate(selected, start=1)}
+
+
+def render_template(name, no_of_variable, plot_data, image_path, title=""):
+    """Draw one template to image_path. Runs inside the renderer worker."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    try:
+        get_templates(no_of_variable)[normalize_name(name)](ax, plot_data, title)
+        if not ax.get_title():
+            ax.set_title(title)
+        fig.tight_layout()
+        fig.savefig(image_path)
+    finally:
+        plt.close(fig)
@@ -1,229 +1,152 @@
-import json
-import google.generativeai as genai
-import pandas as pd
-import numpy as np
-import scipy.stats as stats
-import scipy as scipy
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
-import utils
+import llm_client
+import llm_schemas
+import instrumentation
+import artifacts
+import outliers
+import prompt_fragments
+import preprocess_methods
+import dataset_profile
 from kb_preprocess import PreprocessorKB
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY1")
 
 class PreprocessorAgent:
-    def __init__(self, knowledge_base: PreprocessorKB):
-        genai.configure(api_key=GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+    def __init__(self, knowledge_base: PreprocessorKB, artifact_dir: str = artifacts.UPLOAD_DIR):
+        self.model = llm_client.get_model(llm_client.MODEL_NAME)
         self.knowledge_base = knowledge_base
-        self.preprocess_knowledge = None
-        self.prior_test_res = None
-        self.outlier_result = None
-        self.missing_value_result = None
-
-    def fetch_knowledge(self, var_type):
-        temp = self.knowledge_base.search_knowledge(var_type)
-        self.preprocess_knowledge = json.loads(temp)
-        return
-
-    def metadata_generator(self, column_types: dict, context: str = None):
-        prompt = f"""
-            You are meta data generator expert. for given set of column and along with data types, generate metadata of each column.
-            {column_types}
-            {context}
-
-            return the output in JSON format.
-            {{
-                column_name: its_description_string,
-                column_name: its_description_string,
-                ....,
-                dataset_desc: small description of entire dataset.
-            }}
-        """
-
-        response = self.model.generate_content(prompt)
-        metadata = utils.extract_json_from_response(response.text)
-        try:
-            metadata1 = json.loads(metadata)
-            return metadata1
-        except Exception as e:
-            print("Error parsing LLM response:", e)
-            print("LLM raw output:\n", response.text)
-            return {}
-
-    def outlier_detector(self, data_column, data_type, metadata):
-        prior_tests = self.preprocess_knowledge.get('prior_tests', [])
-        if not prior_tests:
-            return {"error": "No prior tests found in knowledge base."}
-
-        prompt_1 = f"""
-            You are a data scientist. For the following statistical tests, generate executable Python code that directly uses a variable called `data_column`:
-
-            Statistical Tests:
-            {json.dumps(prior_tests, indent=2)}
-
-            Instructions:
-            - DO NOT define any functions.
-            - DO NOT include any import statements.
-            - Assume `data_column` is already defined and contains the numerical data.
-            - Write executable Python code that runs the tests directly and stores the results.
-            - Ensure that code should be executable, it shouldn't have any errors.
-            - Convert all NumPy or SciPy results into plain Python types using float() or int() if needed.
-            - Create a dictionary named `results` that contains the test results in this format:
-            {{
-              "test_name_1": result_1,
-              "test_name_2": result_2,
-              ...
-            }}
-            - The final line of your code must define this `results` dictionary.
-            - Return ONLY the Python code. No comments, no markdown, and no explanations.
+        self.artifact_dir = artifact_dir
+
+    def type_knowledge(self, column_types: dict):
+        """KB fragments for each column type in the dataset; types without an entry are left out."""
+        knowledge = {}
+        for col_type in sorted(set(column_types.values())):
+            fragments = self.knowledge_base.fragments(col_type)
+            if fragments is not None:
+                knowledge[col_type] = fragments
+        return knowledge
+
+    def plan(self, dataset, column_types: dict, context: str = None, profile: dataset_profile.DatasetProfile = None):
+        """One LLM call for the whole dataset: metadata, keep/drop and the outlier and imputation method of every column.
+
+        Returns {"dataset_desc": str, "columns": {column: plan}} with an entry
+        for every column in column_types; see resolve_plan.
         """
-
-        response = self.model.generate_content(prompt_1)
-        prior_code = utils.extract_json_from_response(response.text)
-        local_vars = {}
-        try:
-            exec(prior_code, {"np": np, "pd": pd, "stats": stats, "scipy": scipy, "data_column": data_column}, local_vars)
-        except Exception as e:
-            print(f"[ERROR] Failed to execute prior test code: {e}")
-            return {"error": "Execution of prior test code failed."}
-
-        raw_results = local_vars.get("results", {})
-        self.prior_test_res = utils.convert_to_serializable(raw_results)
-
-        outlier_methods = self.preprocess_knowledge.get('outlier_detection', [])
-        if not outlier_methods:
-            return {"error": "No outlier detection methods found in knowledge base."}
-
-        prompt_2 = f"""
-            You are a data preprocessing expert. Choose the best outlier detection method based on the following:
-
-            - Data type: {data_type}
-            - Column metadata: {metadata}
-            - Prior test results: {json.dumps(self.prior_test_res, indent=2)}
-            - Available outlier detection methods: {json.dumps(outlier_methods, indent=2)}
-
-            Instructions:
-            - Select the most suitable method based on prior test results and data characteristics.
-            - Return your selection and reasoning in this JSON format:
-            {{
-              "selected_method": "Name of selected method",
-              "reasoning": "Why this method fits the data",
-              "python_code": "Python code to apply this outlier detection method on `data_column`"
-            }}
-            - Only return the JSON. Do not include markdown or extra explanations.
-            - In the python code, DO NOT define any functions.
-            - DO NOT include any import statements.
-            - In the python code, store the detected outlier indexes in the variable name `outlier_indexes`.
-            - Write executable Python code that runs the tests directly and stores the results.
-            - Convert all NumPy or SciPy results into plain Python types using float() or int() if needed.
-        """
-        response2 = self.model.generate_content(prompt_2)
-        method_response = utils.extract_json_from_response(response2.text)
-        selected_method_json = json.loads(method_response)
-        outlier_vars = {}
-        try:
-            exec(selected_method_json["python_code"], {"np": np, "pd": pd, "stats": stats, "scipy":scipy, "data_column": data_column}, outlier_vars)
-        except Exception as e:
-            print(f"[ERROR] Failed to execute outlier detection code: {e}")
-            return {
-                "selected_method": selected_method_json.get("selected_method"),
-                "reasoning": selected_method_json.get("reasoning"),
-                "error": "Execution of selected outlier detection code failed."
+        profile = profile or dataset_profile.DatasetProfile(dataset)
+        knowledge = self.type_knowledge(column_types)
+        summaries = {
+            column: {"type": col_type, **preprocess_methods.column_summary(dataset[column], col_type, profile)}
+            for column, col_type in column_types.items()
+        }
+        methods = {
+            col_type: {
+                "outlier_detection": fragments.value("outlier_detection"),
+                "missing_value_imputation": fragments.value("missing_value_imputation")
             }
-
-        self.outlier_result = {
-            "selected_method": selected_method_json.get("selected_method"),
-            "reasoning": selected_method_json.get("reasoning"),
-            "outlier_indexes": utils.convert_to_serializable(outlier_vars.get('outlier_indexes', []))
+            for col_type, fragments in knowledge.items()
+        }
+        enums = {
+            "column": list(column_types),
+            "outlier_method": sorted({m for f in knowledge.values() for m in preprocess_methods.kb_methods(f.knowledge, "outlier")}),
+            "imputation_method": sorted({m for f in knowledge.values() for m in preprocess_methods.kb_methods(f.knowledge, "imputation")})
         }
 
-        return self.outlier_result
+        prompt = f"""
+            You are a data preprocessing planner. Plan the preprocessing of every column of a tabular dataset in one answer.
 
-    def missing_value_imputer(self, data_column, data_type, metadata):
-        import builtins
+            Context: {context if context else "None"}
 
-        missing_value_methods = self.preprocess_knowledge.get('missing_value_imputation', [])
-        if not missing_value_methods:
-            return {"error": "No missing value imputation methods found in knowledge base."}
+            Column Summaries:
+            {prompt_fragments.compact(summaries)}
 
-        prompt = f"""
-            You are a data expert. You are given with missing value imputation methods and some results applied on data column.
-            - Select appropriate missing value method based on given results, metadata and column type.
-            missing_value_method: {missing_value_methods}
-            metadata: {metadata}
-            column_type: {data_type}
-            outlier_detected: {self.outlier_result}
+            Methods by Column Type:
+            {prompt_fragments.compact(methods)}
 
             Instructions:
-            - Select the most suitable method based on prior test results and data characteristics.
-            - You also need to return the python code to apply the selected method on `data_column`.
-            - Assume data_column is already defined and contains data.
-            - Write executable Python code that runs the imputation directly and stores the results.
-            - Convert all NumPy or SciPy results into plain Python types using float() or int() if needed.
-            - Do not include any import statements.
-            - DO NOT define any functions.
-            - Return your selection and reasoning in this JSON format:
+            - For every column, write a short description of what it contains (its metadata).
+            - Decide for every column whether to keep it. Drop features that are irrelevant, redundant, identifiers, or date and time related.
+            - Do NOT drop columns that are essential for analysis or mentioned in the context.
+            - For every column, choose one outlier detection method and one missing value imputation method from the methods listed for its type, based on its summary (skew, normality p-value, class balance, missing values).
+            - Copy method names exactly as listed. The methods are applied by built-in implementations, so do not return any code.
+            - Return the result in this JSON format:
             {{
-              "selected_method": "Name of selected method",
-              "reasoning": "Reason why this method selected",
-              "python_code": "Python code to apply this missing value imputation method on `data_column`"
+              "dataset_desc": "small description of entire dataset",
+              "columns": [
+                {{
+                  "column": "column name",
+                  "description": "what the column contains",
+                  "keep": true,
+                  "outlier_method": "name of selected outlier detection method",
+                  "imputation_method": "name of selected imputation method",
+                  "reasoning": "why these methods fit the column"
+                }}
+              ]
             }}
+            - Do NOT include markdown, explanations, or extra text.
         """
 
-        response = self.model.generate_content(prompt)
-        response_json = json.loads(utils.extract_json_from_response(response.text))
-        local_vars = {"data_column": data_column}
         try:
-            exec(response_json["python_code"], {}, local_vars)
-            imputed_column = local_vars.get("data_column", data_column)
-            self.missing_value_result = {
-                "selected_method": response_json["selected_method"],
-                "reasoning": response_json["reasoning"],
-                "imputed_data": imputed_column
-            }
-            return self.missing_value_result
+            response = self.model.generate_content(prompt, generation_config=llm_schemas.json_config(llm_schemas.PreprocessingPlan, enums))
+            planned = llm_schemas.parse(response.text, llm_schemas.PreprocessingPlan)
         except Exception as e:
-            return {
-                "error": f"Failed to execute imputation code: {str(e)}",
-                "selected_method": response_json.get("selected_method"),
-                "reasoning": response_json.get("reasoning"),
-                "code": response_json.get("python_code")
-            }
-
-    def feature_remover(self, column_data_type: dict, metadata: dict, context: str = None):
-        prompt = f"""
-            You are a feature selection expert helping with preprocessing of tabular data.
-
-            Task:
-            - Analyze the dataset's column names, their data types, and metadata.
-            - Remove features that are irrelevant, redundant, or not useful for modeling.
-            - Provide an updated dictionary of column names with their types after removing the unnecessary features.
-            - Remove date and time related columns if any
-            - Do NOT remove columns that are essential for analysis
-
-            Input:
-            Column Data Types: {json.dumps(column_data_type, indent=2)}
-            Metadata: {json.dumps(metadata, indent=2)}
-            Context: {context if context else "None"}
-
-            - Return a clean Python dictionary of the remaining column names and types.
-            - Return the result in this format:
-            {{
-              "column_name_1": "type_1",
-              "column_name_2": "type_2",
-              ...
-            }}
-            - Do NOT include markdown, explanations, or extra text.
+            print(f"[ERROR] Preprocessing plan failed, using the knowledge base defaults: {e}")
+            planned = {}
+        return self.resolve_plan(planned, column_types, knowledge)
+
+    def resolve_plan(self, planned: dict, column_types: dict, knowledge: dict):
+        """Complete an LLM plan: columns it left out are kept, and a method that is not
+        listed for the column's type (or has no native implementation) is replaced by
+        the first one that is.
         """
-
-        response = self.model.generate_content(prompt)
-        cleaned_json_text = utils.extract_json_from_response(response.text)
+        by_column = {item.get("column"): item for item in planned.get("columns", []) if isinstance(item, dict)}
+        columns = {}
+        for column, col_type in column_types.items():
+            item = by_column.get(column, {})
+            fragments = knowledge.get(col_type)
+            columns[column] = {
+                "description": item.get("description") or f"Column '{column}' of type {col_type}.",
+                "keep": item.get("keep") is not False,
+                "outlier_method": self.pick_method(item.get("outlier_method"), fragments, "outlier"),
+                "imputation_method": self.pick_method(item.get("imputation_method"), fragments, "imputation"),
+                "reasoning": item.get("reasoning") or "Default method from the knowledge base."
+            }
+        return {"dataset_desc": planned.get("dataset_desc", ""), "columns": columns}
+
+    def pick_method(self, name, fragments, kind):
+        options = preprocess_methods.kb_methods(fragments.knowledge, kind) if fragments is not None else []
+        by_name = {preprocess_methods.normalize_name(option): option for option in options}
+        return by_name.get(preprocess_methods.normalize_name(name or ""), options[0] if options else None)
+
+    def preprocess_column(self, data_column, col_type: str, column_plan: dict, has_missing: bool):
+        """Run the planned outlier detection and imputation natively. Returns (outlier_result, imputed column or None)."""
+        method = column_plan["outlier_method"]
+        outlier_result = {"selected_method": method, "reasoning": column_plan["reasoning"]}
+        if method is None:
+            outlier_result["error"] = f"No outlier detection method found for type: {col_type}"
+        else:
+            try:
+                with instrumentation.span("outlier_detection", method=method):
+                    indexes = preprocess_methods.detect_outliers(method, data_column)
+                outlier_result.update(outliers.compact(
+                    indexes,
+                    len(data_column),
+                    os.path.join(self.artifact_dir, f"{artifacts.safe_name(data_column.name)}_outliers.npy")
+                ))
+            except Exception as e:
+                print(f"[ERROR] Outlier detection failed for {data_column.name}: {e}")
+                outlier_result["error"] = f"Outlier detection with {method} failed: {e}"
+
+        if not has_missing:
+            print(f"No missing values in column: {data_column.name}")
+            return outlier_result, None
+        method = column_plan["imputation_method"]
+        if method is None:
+            print(f"[ERROR] No imputation method found for type: {col_type}")
+            return outlier_result, None
         try:
-            cleaned_column_data_type = json.loads(cleaned_json_text)
-            return cleaned_column_data_type
+            with instrumentation.span("imputation", method=method):
+                return outlier_result, preprocess_methods.impute(method, data_column)
         except Exception as e:
-            print("Error parsing cleaned column data types:", e)
-            print("Raw response:\n", response.text)
-            return column_data_type
+            print(f"[ERROR] Imputation with {method} failed for {data_column.name}: {e}")
+            return outlier_result, None
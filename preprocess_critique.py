@@ -1,72 +1,87 @@
 import pandas as pd
 import numpy as np
 from scipy import stats
+from concurrent.futures import ThreadPoolExecutor
+
+import critique_checks
+from dataset_profile import DatasetProfile
 
 
 class PreprocessorCritique:
-    def __init__(self, original_csv, preprocessed_csv, compare_columns):
-        self.original_df = pd.read_csv(original_csv)
-        self.processed_df = pd.read_csv(preprocessed_csv)
+    def __init__(self, original_df: pd.DataFrame, processed_df: pd.DataFrame, compare_columns,
+                 original_profile: DatasetProfile = None, processed_profile: DatasetProfile = None):
+        """Compares the loaded frames; pass the profiles already built for them to skip rescanning for missing values."""
+        self.original_df = original_df
+        self.processed_df = processed_df
         self.compare_columns = compare_columns
+        self.original_profile = original_profile or DatasetProfile(original_df)
+        self.processed_profile = processed_profile or DatasetProfile(processed_df)
 
     def compare_distribution(self):
-        distribution_result = {}
-
-        for column, col_type in self.compare_columns.items():
-            dist_res = "Error"
-            reason = "Not evaluated"
-
-            try:
-                original = self.original_df[column].dropna()
-                processed = self.processed_df[column].dropna()
-
-                if col_type == "numerical continuous":
-                    stat, p_value = stats.ks_2samp(original, processed)
-                    dist_res = "Same" if p_value > 0.05 else "Different"
-                    reason = f"KS test p-value = {p_value:.4f}"
-
-                elif col_type == "numerical discrete":
-                    stat, p_value = stats.mannwhitneyu(original, processed, alternative='two-sided')
-                    dist_res = "Same" if p_value > 0.05 else "Different"
-                    reason = f"Mann–Whitney U test p-value = {p_value:.4f}"
-
-                elif col_type == "categorical nominal":
-                    original = original.astype(str)
-                    processed = processed.astype(str)
-
-                    orig_counts = np.unique(original, return_counts=True)
-                    proc_counts = np.unique(processed, return_counts=True)
-
-                    categories = list(set(orig_counts[0]) | set(proc_counts[0]))
-                    orig_freq = [dict(zip(*orig_counts)).get(cat, 0) for cat in categories]
-                    proc_freq = [dict(zip(*proc_counts)).get(cat, 0) for cat in categories]
-
-                    stat, p_value = stats.chisquare(f_obs=orig_freq, f_exp=proc_freq)
-                    dist_res = "Same" if p_value > 0.05 else "Different"
-                    reason = f"Chi-square test p-value = {p_value:.4f}"
-
-                elif col_type == "categorical ordinal":
-                    original = original.astype(str)
-                    processed = processed.astype(str)
-
-                    unique_values = sorted(set(original) | set(processed))
-                    value_to_rank = {val: rank for rank, val in enumerate(unique_values)}
-
-                    original_ranked = np.array([value_to_rank[val] for val in original])
-                    processed_ranked = np.array([value_to_rank[val] for val in processed])
-
-                    stat, p_value = stats.mannwhitneyu(original_ranked, processed_ranked, alternative='two-sided')
-                    dist_res = "Same" if p_value > 0.05 else "Different"
-                    reason = f"Mann–Whitney U test (ordinal) p-value = {p_value:.4f}"
-
-                else:
-                    dist_res = "Error"
-                    reason = f"Unsupported data type: {col_type}"
-
-            except Exception as e:
+        columns = list(self.compare_columns.items())
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(columns)))) as executor:
+            results = list(executor.map(lambda item: self.compare_column(*item), columns))
+        return {column: result for (column, _), result in zip(columns, results)}
+
+    def compare_column(self, column, col_type):
+        dist_res = "Error"
+        reason = "Not evaluated"
+
+        try:
+            original_full = self.original_df[column].reset_index(drop=True)
+            processed_full = self.processed_df[column].reset_index(drop=True)
+
+            if original_full.equals(processed_full):
+                return {"result": "Same", "reason": "No values were imputed"}
+
+            original = original_full[~self.original_profile.null_mask(column)]
+            processed = processed_full[~self.processed_profile.null_mask(column)]
+
+            if col_type == "numerical continuous":
+                stat, p_value = stats.ks_2samp(original, processed)
+                dist_res = "Same" if p_value > 0.05 else "Different"
+                reason = f"KS test p-value = {p_value:.4f}"
+
+            elif col_type == "numerical discrete":
+                stat, p_value = stats.mannwhitneyu(original, processed, alternative='two-sided')
+                dist_res = "Same" if p_value > 0.05 else "Different"
+                reason = f"Mann–Whitney U test p-value = {p_value:.4f}"
+
+            elif col_type == "categorical nominal":
+                codes, categories = pd.factorize(pd.concat([original.astype(str), processed.astype(str)], ignore_index=True))
+                orig_freq = np.bincount(codes[:len(original)], minlength=len(categories))
+                proc_freq = np.bincount(codes[len(original):], minlength=len(categories))
+                expected = proc_freq * (orig_freq.sum() / proc_freq.sum())
+
+                stat, p_value = stats.chisquare(f_obs=orig_freq, f_exp=expected)
+                dist_res = "Same" if p_value > 0.05 else "Different"
+                reason = f"Chi-square test p-value = {p_value:.4f}"
+
+            elif col_type == "categorical ordinal":
+                ranks, _ = pd.factorize(pd.concat([original.astype(str), processed.astype(str)], ignore_index=True), sort=True)
+                original_ranked = ranks[:len(original)]
+                processed_ranked = ranks[len(original):]
+
+                stat, p_value = stats.mannwhitneyu(original_ranked, processed_ranked, alternative='two-sided')
+                dist_res = "Same" if p_value > 0.05 else "Different"
+                reason = f"Mann–Whitney U test (ordinal) p-value = {p_value:.4f}"
+
+            else:
                 dist_res = "Error"
-                reason = str(e)
+                reason = f"Unsupported data type: {col_type}"
 
-            distribution_result[column] = {"result": dist_res, "reason": reason}
-
-        return distribution_result
+        except Exception as e:
+            dist_res = "Error"
+            reason = str(e)
+
+        return {"result": dist_res, "reason": reason}
+
+    def validate_results(self, outlier_result):
+        """Deterministic checks on outlier detection and imputation for every compared column."""
+        validation_result = {}
+        for column in self.compare_columns:
+            issues = critique_checks.outlier_issues(outlier_result.get(column, {}), self.original_profile.n_rows)
+            if column in self.processed_profile and self.processed_profile.has_nulls(column):
+                issues.append("Missing values remain after imputation.")
+            validation_result[column] = {"valid": not issues, "issues": issues}
+        return validation_result
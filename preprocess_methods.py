@@ -0,0 +1,258 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Native implementations of the outlier detection and imputation methods
+# listed in preprocess_kb.json. The preprocessing plan only names a method;
+# the work is done here, with no generated code.
+
+RARE_SHARE = 0.01
+ROLLING_WINDOW = 7
+SHAPIRO_MAX_ROWS = 5000
+NO_ROWS = np.array([], dtype=np.int64)
+
+
+def normalize_name(name):
+    return " ".join(str(name).lower().replace("_", " ").split())
+
+
+def numeric_values(data_column: pd.Series):
+    return pd.to_numeric(data_column, errors="coerce")
+
+
+def positions(mask):
+    """Row positions where a boolean mask is set; comparisons with NaN are already False."""
+    return np.flatnonzero(np.asarray(mask, dtype=bool))
+
+
+# ---------- outlier detection ----------
+
+def z_score(data_column, threshold=3.0):
+    values = numeric_values(data_column)
+    std = values.std()
+    if not std:
+        return NO_ROWS
+    return positions(((values - values.mean()) / std).abs() > threshold)
+
+
+def iqr(data_column, factor=1.5):
+    values = numeric_values(data_column)
+    q1, q3 = values.quantile(0.25), values.quantile(0.75)
+    spread = q3 - q1
+    return positions((values < q1 - factor * spread) | (values > q3 + factor * spread))
+
+
+def robust_z(values: pd.Series, threshold=3.5):
+    median = values.median()
+    mad = (values - median).abs().median()
+    if not mad:
+        return NO_ROWS
+    return positions((0.6745 * (values - median) / mad).abs() > threshold)
+
+
+def modified_z_score(data_column):
+    return robust_z(numeric_values(data_column))
+
+
+def frequency_analysis(data_column, share=RARE_SHARE):
+    """Rows holding values that make up less than share of the non-missing rows."""
+    frequencies = data_column.map(data_column.value_counts(normalize=True))
+    return positions(frequencies < share)
+
+
+def cardinality_check(data_column):
+    """Singleton categories in a column that otherwise repeats its values."""
+    counts = data_column.value_counts()
+    if counts.empty or len(counts) > 0.5 * counts.sum():
+        return NO_ROWS
+    return positions(data_column.map(counts) == 1)
+
+
+def gap_analysis(data_column):
+    """IQR fences on the ordinal level codes, so levels far from the rest of the scale stand out."""
+    codes = pd.Series(pd.factorize(data_column, sort=True)[0], index=data_column.index).where(data_column.notna())
+    return iqr(codes)
+
+
+def imbalance_analysis(data_column, share=0.05):
+    return frequency_analysis(data_column, share)
+
+
+def rolling_statistics(data_column, window=ROLLING_WINDOW, k=3.0):
+    values = numeric_values(data_column)
+    rolling = values.rolling(window, min_periods=2, center=True)
+    return positions((values - rolling.mean()).abs() > k * rolling.std())
+
+
+def residual_outliers(data_column, window=ROLLING_WINDOW):
+    """Robust z-score of the residual after removing a centered rolling median trend."""
+    values = numeric_values(data_column)
+    return robust_z(values - values.rolling(window, min_periods=1, center=True).median())
+
+
+def rate_of_change(data_column):
+    return robust_z(numeric_values(data_column).diff())
+
+
+OUTLIER_METHODS = {
+    "z-score": z_score,
+    "iqr (interquartile range)": iqr,
+    "iqr method": iqr,
+    "count-based thresholds": iqr,
+    "modified z-score (mad)": modified_z_score,
+    "frequency analysis": frequency_analysis,
+    "cardinality check": cardinality_check,
+    "gap analysis": gap_analysis,
+    "imbalance analysis": imbalance_analysis,
+    "pattern analysis": imbalance_analysis,
+    "rolling statistics": rolling_statistics,
+    "temporal pattern analysis": rolling_statistics,
+    # Isolation forest needs scikit-learn; the rolling band is its time-aware stand-in.
+    "isolation forest (time-aware)": rolling_statistics,
+    "seasonal decomposition": residual_outliers,
+    "rate of change analysis": rate_of_change,
+    "rate analysis": rate_of_change,
+}
+
+
+# ---------- missing value imputation ----------
+
+def fill_value(data_column, value):
+    return data_column.fillna(value) if value is not None and not pd.isna(value) else data_column
+
+
+def mean_imputation(data_column):
+    return fill_value(data_column, numeric_values(data_column).mean())
+
+
+def median_imputation(data_column):
+    return fill_value(data_column, numeric_values(data_column).median())
+
+
+def mode_imputation(data_column):
+    mode = data_column.mode()
+    return fill_value(data_column, mode.iloc[0] if len(mode) else None)
+
+
+def random_sampling(data_column, seed=0):
+    """Fill from the observed values, keeping the category distribution; seeded so runs repeat."""
+    observed = data_column.dropna()
+    missing = data_column.isna()
+    if observed.empty or not missing.any():
+        return data_column
+    filled = data_column.copy()
+    filled[missing] = np.random.default_rng(seed).choice(observed.to_numpy(), size=int(missing.sum()))
+    return filled
+
+
+def missing_category(data_column):
+    if isinstance(data_column.dtype, pd.CategoricalDtype):
+        data_column = data_column.cat.add_categories(["Missing"])
+    return data_column.fillna("Missing")
+
+
+def forward_fill(data_column):
+    return data_column.ffill().bfill()
+
+
+def backward_fill(data_column):
+    return data_column.bfill().ffill()
+
+
+def linear_interpolation(data_column):
+    values = numeric_values(data_column)
+    if values.notna().sum() < 2:
+        return median_imputation(data_column)
+    return data_column.fillna(values.interpolate(limit_direction="both"))
+
+
+def interpolation_rounding(data_column):
+    filled = linear_interpolation(data_column)
+    return filled.where(data_column.notna(), numeric_values(filled).round())
+
+
+def ordinal_codes(data_column):
+    codes, levels = pd.factorize(data_column, sort=True)
+    return pd.Series(codes, index=data_column.index, dtype=float).where(data_column.notna()), levels
+
+
+def ordinal_median(data_column):
+    codes, levels = ordinal_codes(data_column)
+    if codes.isna().all():
+        return data_column
+    return data_column.fillna(levels[int(round(codes.median()))])
+
+
+def ordinal_interpolation(data_column):
+    codes, levels = ordinal_codes(data_column)
+    if codes.notna().sum() < 2:
+        return mode_imputation(data_column)
+    filled = codes.interpolate(limit_direction="both").round().astype(int)
+    return data_column.fillna(pd.Series(levels[filled.to_numpy()], index=data_column.index))
+
+
+IMPUTATION_METHODS = {
+    "mean imputation": mean_imputation,
+    "median imputation": median_imputation,
+    "mode imputation": mode_imputation,
+    "mode imputation (windowed)": mode_imputation,
+    "random sampling": random_sampling,
+    "create 'missing' category": missing_category,
+    "forward fill (ffill)": forward_fill,
+    "backward fill (bfill)": backward_fill,
+    "linear interpolation": linear_interpolation,
+    "interpolation + rounding": interpolation_rounding,
+    "median (ordinal encoding)": ordinal_median,
+    "interpolation (ordinal)": ordinal_interpolation,
+    # Model-based seasonal and ARIMA fills are approximated by interpolation.
+    "seasonal decomposition + imputation": linear_interpolation,
+    "seasonal pattern imputation": interpolation_rounding,
+    "arima/sarima imputation": linear_interpolation,
+}
+
+
+def has_method(registry, name):
+    return normalize_name(name) in registry
+
+
+def kb_methods(knowledge, kind):
+    """Method names listed in a preprocessing KB entry that have a native implementation."""
+    if kind == "outlier":
+        options, registry = knowledge.get("outlier_detection", {}).get("methods", []), OUTLIER_METHODS
+    else:
+        options, registry = knowledge.get("missing_value_imputation", {}).get("filling_methods", []), IMPUTATION_METHODS
+    return [option["method"] for option in options if has_method(registry, option.get("method", ""))]
+
+
+def detect_outliers(method, data_column):
+    return OUTLIER_METHODS[normalize_name(method)](data_column)
+
+
+def impute(method, data_column):
+    return IMPUTATION_METHODS[normalize_name(method)](data_column)
+
+
+# ---------- prior tests ----------
+
+def column_summary(data_column: pd.Series, col_type: str, profile):
+    """The facts the prior-test code used to compute, for the plan prompt: size, missingness, shape or balance.
+
+    Counts come from the DatasetProfile of the dataset the column belongs to.
+    """
+    column = profile[data_column.name]
+    summary = {"rows": profile.n_rows, "missing": column["null_count"], "distinct": column["distinct"]}
+    observed = profile.observed(data_column)
+    values = numeric_values(observed).dropna() if "numerical" in col_type else pd.Series(dtype=float)
+    if len(values) > 2:
+        sample = values if len(values) <= SHAPIRO_MAX_ROWS else values.sample(SHAPIRO_MAX_ROWS, random_state=0)
+        summary.update({
+            "mean": round(float(values.mean()), 4),
+            "std": round(float(values.std()), 4),
+            "skew": round(float(stats.skew(values)), 4),
+            "kurtosis": round(float(stats.kurtosis(values)), 4),
+            "shapiro_p": round(float(stats.shapiro(sample).pvalue), 4) if column["distinct"] > 1 else None
+        })
+    elif len(observed):
+        shares = observed.value_counts(normalize=True)
+        summary.update({"top_share": round(float(shares.iloc[0]), 4), "minority_share": round(float(shares.iloc[-1]), 4)})
+    return summary
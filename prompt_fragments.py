@@ -0,0 +1,59 @@
+"""Compact, pre-rendered prompt text for the static knowledge base sections.
+
+A KB entry is parsed and every section rendered once, when it is first
+looked up for a (no_of_variable, var_type) or preprocessing data type; all
+later columns, pairs and critique retries in the process reuse the same
+strings instead of re-serializing the entry with indent=2.
+"""
+import json
+
+# section -> (path into the KB entry, value when missing)
+STAT_SECTIONS = {
+    "priority_tests": (("priority_tests",), []),
+    "descriptive": (("descriptive",), {}),
+    "descriptive_statistics": (("descriptive", "statistics"), []),
+    "descriptive_selection": (("descriptive", "selection_criteria"), []),
+    "descriptive_application": (("descriptive", "application_criteria"), []),
+    "visualization": (("visualization",), {}),
+    "inferential_tests": (("inferential", "tests"), []),
+    "inferential_selection": (("inferential", "selection_criteria"), []),
+    "inferential_application": (("inferential", "application_criteria"), []),
+}
+PREPROCESS_SECTIONS = {
+    "prior_tests": (("prior_tests",), []),
+    "outlier_detection": (("outlier_detection",), []),
+    "missing_value_imputation": (("missing_value_imputation",), []),
+}
+
+
+def compact(value):
+    """JSON without indentation or padding; the same content in far fewer prompt tokens."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def lookup(entry: dict, path, default):
+    value = entry
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return default
+        value = value[key]
+    return value
+
+
+class KnowledgeFragments:
+    """One parsed KB entry plus its sections rendered for prompts.
+
+    knowledge is shared by every caller in the process and must not be
+    modified.
+    """
+
+    def __init__(self, knowledge: dict, sections: dict = STAT_SECTIONS):
+        self.knowledge = knowledge
+        self.values = {name: lookup(knowledge, path, default) for name, (path, default) in sections.items()}
+        self.rendered = {name: compact(value) for name, value in self.values.items()}
+
+    def __getitem__(self, section: str):
+        return self.rendered[section]
+
+    def value(self, section: str):
+        return self.values[section]
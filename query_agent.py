@@ -1,48 +1,111 @@
-import pandas as pd
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
+import llm_client
+import result_store
+import resources
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY1")
+
+UNIT_DESCRIPTIONS = {
+    "preprocessing": "Preprocessing of column {name}: outlier detection, missing value imputation, distribution comparison and validation.",
+    "column": "Univariate analysis of column {name}: descriptive statistics, visualizations and inferential tests.",
+    "pair": "Bivariate analysis of the column pair {name}: descriptive statistics, visualizations and inferential tests.",
+}
+# Retrieved units scoring below this cosine similarity are ignored; with none left and no column named, the
+# question is answered from the summary of every unit.
+QUERY_MIN_SIMILARITY = float(os.getenv("QUERY_MIN_SIMILARITY", "0.35"))
+SUMMARY_MAX_STATS = 5
+SUMMARY_MAX_CHARS = 400
+
+
+def section(value, key):
+    item = value.get(key) if isinstance(value, dict) else None
+    return item if isinstance(item, dict) else {}
+
+
+def unit_summary(kind, name, value):
+    """Short text of one unit for retrieval and the dataset overview: what it is, key statistics and test conclusions."""
+    parts = [UNIT_DESCRIPTIONS[kind].format(name=name)]
+    if kind == "preprocessing":
+        outliers = section(value, "outlier_result")
+        if "outlier_count" in outliers:
+            parts.append(f"{outliers['outlier_count']} outliers ({outliers.get('outlier_percent')}%) found with {outliers.get('selected_method')}.")
+        distribution = section(value, "distribution_result")
+        if distribution.get("result"):
+            parts.append(f"Distribution after preprocessing: {distribution['result']}.")
+    else:
+        stats = section(section(value, "descriptive"), "statistics_results")
+        texts = [stat.get("result_text") or f"{stat_name}: {stat.get('result_value')}" for stat_name, stat in stats.items() if isinstance(stat, dict)]
+        if texts:
+            parts.append("; ".join(str(text) for text in texts[:SUMMARY_MAX_STATS]) + ".")
+        parts += [f"{test}: {info['conclusion']}" for test, info in section(value, "inferential").items() if isinstance(info, dict) and info.get("conclusion")]
+    return " ".join(parts)[:SUMMARY_MAX_CHARS]
+
 
 class QueryAgent:
+    """Answers questions about one analysis, reading only the columns and pairs relevant to the question."""
+
     def __init__(self, file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            self.combined_result_text = f.read()
+        import faiss
 
-        self.texts = self.split_text(self.combined_result_text, chunk_size=500, overlap=50)
+        self.store = result_store.open_store(file_path)
+        self.columns = self.store.names("column")
+        self.pairs = self.store.names("pair")
+        # Each unit is embedded by its summary, so questions about findings match units that never name them.
+        self.units = []
+        self.texts = []
+        for kind in UNIT_DESCRIPTIONS:
+            for name, value in self.store.items(kind).items():
+                self.units.append((kind, name))
+                self.texts.append(unit_summary(kind, name, value))
 
-        self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-        embeddings = self.embedding_model.encode(self.texts)
+        self.embedding_model = resources.embedding_model()
+        embeddings = self.embedding_model.encode(self.texts, normalize_embeddings=True)
 
         dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
+        self.index = faiss.IndexFlatIP(dimension)
         self.index.add(np.array(embeddings))
 
-        genai.configure(api_key=GOOGLE_API_KEY)
-        self.llm_model = genai.GenerativeModel('gemini-2.0-flash')
+        self.llm_model = llm_client.get_model(llm_client.MODEL_NAME)
 
-    def split_text(self, text, chunk_size=500, overlap=50):
-        chunks = []
-        for i in range(0, len(text), chunk_size - overlap):
-            chunks.append(text[i:i + chunk_size])
-        return chunks
-    
-    def get_answer(self, query, k=3):
-        query_embedding = self.embedding_model.encode([query])
-        D, I = self.index.search(np.array(query_embedding), k=k)
+    def mentioned_units(self, query):
+        """Columns named in the query, their preprocessing, and pairs whose both columns are named."""
+        text = query.lower()
+        columns = [col for col in self.columns if col.lower() in text]
+        units = [(kind, col) for col in columns for kind in ("preprocessing", "column")]
+        for pair in self.pairs:
+            if any(pair == f"{col1}-{col2}" for col1 in columns for col2 in columns if col1 != col2):
+                units.append(("pair", pair))
+        return units
+
+    def relevant_units(self, query, k=3):
+        """Named units plus up to k retrieved ones; empty when nothing is named and nothing is similar enough."""
+        units = self.mentioned_units(query)
+        if len(units) < k and self.units:
+            query_embedding = self.embedding_model.encode([query], normalize_embeddings=True)
+            scores, ids = self.index.search(np.array(query_embedding), k=min(k, len(self.units)))
+            units += [self.units[i] for score, i in zip(scores[0], ids[0]) if score >= QUERY_MIN_SIMILARITY and self.units[i] not in units]
+        return units
 
-        retrieved_chunks = [self.texts[i] for i in I[0]]
-        context = "\n\n".join(retrieved_chunks)
+    def get_answer(self, query, k=3):
+        units = self.relevant_units(query, k)
+        if units:
+            context = "\n\n".join(
+                f"{kind} {name}:\n{json.dumps(self.store.get(kind, name), indent=2)}" for kind, name in units
+            )
+        else:
+            # A dataset-wide question: give the summary of every unit rather than an arbitrary few in full.
+            context = "Summary of every analysed unit:\n" + "\n".join(f"- {text}" for text in self.texts)
         # print("contex: ", context)
 
         prompt = f"""Answer the question based on the following statistical analysis context:
 
-        {self.combined_result_text}
+        Analysed columns: {", ".join(self.columns)}
+        Analysed pairs: {", ".join(self.pairs)}
+
+        {context}
 
         Question: {query}
         Answer:"""
@@ -0,0 +1,76 @@
+"""Process-wide shared resources: knowledge bases, the LLM backend and the embedding model.
+
+Each resource is created once per process on first use and shared by every
+run and thread in it; agents stay cheap and are built per run on top of
+these. Knowledge bases are rebuilt when their JSON file changes.
+"""
+import os
+import threading
+
+import llm_client
+
+STAT_KB_DIR = os.getenv("STAT_KB_DIR", "stat_kb_dir")
+STAT_KB_FILE = os.getenv("STAT_KB_FILE", "uni_bi_kb.json")
+PREPROCESS_KB_DIR = os.getenv("PREPROCESS_KB_DIR", "preprocess_kb_dir")
+PREPROCESS_KB_FILE = os.getenv("PREPROCESS_KB_FILE", "preprocess_kb.json")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+_resources = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def shared(name, factory, version=None):
+    """The resource stored under name, created with factory() by the first caller.
+
+    A different version (e.g. a KB file's mtime) replaces the stored one.
+    Each name has its own lock, so a slow factory (loading a model) does not
+    block callers of other resources.
+    """
+    with _registry_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _resources or _resources[name][0] != version:
+            _resources[name] = (version, factory())
+        return _resources[name][1]
+
+
+def loaded_kb(kb_class, persist_dir, json_path):
+    kb = kb_class(persist_dir=persist_dir)
+    kb.load_knowledge(json_path)
+    return kb
+
+
+def stat_kb():
+    from kb_statistical import StatisticalKnowledgeBase
+    return shared("stat_kb", lambda: loaded_kb(StatisticalKnowledgeBase, STAT_KB_DIR, STAT_KB_FILE), os.path.getmtime(STAT_KB_FILE))
+
+
+def preprocess_kb():
+    from kb_preprocess import PreprocessorKB
+    return shared("preprocess_kb", lambda: loaded_kb(PreprocessorKB, PREPROCESS_KB_DIR, PREPROCESS_KB_FILE), os.path.getmtime(PREPROCESS_KB_FILE))
+
+
+def llm_backend():
+    """The process's LLM backend (see llm_client.get_client); set_client replaces it for every agent."""
+    return llm_client.get_client()
+
+
+def embedding_model():
+    """Sentence embedding model for QueryAgent. sentence_transformers pulls in torch, so it is imported here."""
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return shared("embedding_model", load)
+
+
+def warm_up_analysis():
+    """Open and load both knowledge bases and create the LLM backend before the first analysis."""
+    stat_kb()
+    preprocess_kb()
+    llm_backend()
+
+
+def warm_up_query():
+    import faiss
+    embedding_model()
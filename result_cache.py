@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import utils
+import result_store
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1") == "1"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join("uploads", "cache"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "2048"))
+# Bump when the combined result layout changes so old entries stop matching.
+CACHE_VERSION = "2"
+KB_FILES = (os.getenv("STAT_KB_FILE", "uni_bi_kb.json"), os.getenv("PREPROCESS_KB_FILE", "preprocess_kb.json"))
+MANIFEST = "manifest.json"
+
+
+def update_with_file(hasher, path, chunk_size=1024 * 1024):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+
+
+def cache_key(file_path: str, data_context: str, model_names=(), kb_files=KB_FILES, options: dict = None):
+    """Hash of everything a combined result depends on: file bytes, context, KB contents, models and options."""
+    hasher = hashlib.sha256(f"v{CACHE_VERSION}\0".encode())
+    update_with_file(hasher, file_path)
+    hasher.update(f"\0{data_context}\0{json.dumps(list(model_names))}\0{json.dumps(options or {}, sort_keys=True)}\0".encode())
+    for kb_file in kb_files:
+        update_with_file(hasher, kb_file)
+    return hasher.hexdigest()
+
+
+def visual_sections(result: dict):
+    for analysis in ("univariate", "bivariate"):
+        for visuals in result.get(analysis, {}).get("visual", {}).values():
+            if isinstance(visuals, dict):
+                for vis_info in visuals.values():
+                    if isinstance(vis_info, dict):
+                        yield vis_info
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class ResultCache:
+    """Content-addressed store of combined results and their images under the uploads directory.
+
+    Each entry is a directory named by its cache key holding result.json
+    and its section store, the referenced images and outlier index files,
+    and a manifest with the selected columns and pairs. The manifest's
+    mtime is the last access time; the least recently used entries are
+    deleted when the store grows past max_mb.
+    """
+
+    def __init__(self, cache_dir: str = RESULT_CACHE_DIR, max_mb: float = RESULT_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_dir(self, key: str):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str):
+        """Return {'result_path', 'selected_data_types', 'selected_pairs'} for a stored analysis, or None."""
+        manifest_path = os.path.join(self.entry_dir(key), MANIFEST)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            os.utime(manifest_path)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(manifest["result_path"]):
+            return None
+        return manifest
+
+    def put(self, key: str, result_path: str, selected_data_types: dict, selected_pairs: list):
+        """Copy a finished result and its images into the store. Returns the stored result path."""
+        entry = self.entry_dir(key)
+        staging = f"{entry}.tmp{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(os.path.join(staging, "images"))
+        os.makedirs(os.path.join(staging, "outliers"))
+
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        for i, vis_info in enumerate(visual_sections(result)):
+            image_path = vis_info.get("image_path")
+            if image_path and os.path.exists(image_path):
+                image_name = f"{i}_{os.path.basename(image_path)}"
+                shutil.copy2(image_path, os.path.join(staging, "images", image_name))
+                vis_info["image_path"] = os.path.join(entry, "images", image_name)
+        for outlier_result in result.get("preprocessing", {}).get("outlier_result", {}).values():
+            index_file = outlier_result.get("outlier_index_file")
+            if index_file and os.path.exists(index_file):
+                file_name = os.path.basename(index_file)
+                shutil.copy2(index_file, os.path.join(staging, "outliers", file_name))
+                outlier_result["outlier_index_file"] = os.path.join(entry, "outliers", file_name)
+
+        utils.dump_json(result, os.path.join(staging, "result.json"), indent=2)
+        result_store.write(result_store.store_path(os.path.join(staging, "result.json")), result)
+        manifest = {
+            "result_path": os.path.join(entry, "result.json"),
+            "selected_data_types": selected_data_types,
+            "selected_pairs": selected_pairs,
+            "created": time.time()
+        }
+        with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Another worker stored the same key first; its entry is equivalent.
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict(keep=entry)
+        return manifest["result_path"]
+
+    def evict(self, keep: str = None):
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            manifest_path = os.path.join(self.cache_dir, key, MANIFEST)
+            if os.path.exists(manifest_path):
+                entries.append((os.path.getmtime(manifest_path), self.entry_dir(key)))
+        entries.sort()
+
+        total = sum(dir_size(path) for _, path in entries)
+        for _, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            print(f"[CACHE] Evicting {path}")
+            total -= dir_size(path)
+            shutil.rmtree(path, ignore_errors=True)
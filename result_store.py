@@ -0,0 +1,163 @@
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+
+import utils
+
+ANALYSIS_KINDS = {"univariate": "column", "bivariate": "pair"}
+SECTIONS = ("descriptive", "visual", "inferential")
+PREPROCESSING_SECTIONS = ("outlier_result", "distribution_result", "validation_result")
+SCHEMA = "CREATE TABLE IF NOT EXISTS sections (kind TEXT, name TEXT, value TEXT, PRIMARY KEY (kind, name))"
+
+
+def store_path(result_path: str):
+    """The SQLite store that sits next to a result JSON export."""
+    return f"{os.path.splitext(result_path)[0]}.sqlite3"
+
+
+def preprocessing_rows(preprocessing: dict):
+    """Split the preprocessing sections into one ('preprocessing', column, value) row per column."""
+    columns = {}
+    for section in PREPROCESSING_SECTIONS:
+        for column, value in (preprocessing.get(section) or {}).items():
+            columns.setdefault(column, {})[section] = value
+    for column, value in columns.items():
+        yield "preprocessing", column, value
+
+
+def rows_from_result(combined: dict):
+    """Split a combined result into (kind, name, value) rows: one per column, pair and preprocessed column."""
+    yield from preprocessing_rows(combined.get("preprocessing", {}))
+
+    for analysis, kind in ANALYSIS_KINDS.items():
+        units = {}
+        for section in SECTIONS:
+            for name, value in combined.get(analysis, {}).get(section, {}).items():
+                units.setdefault(name, {})[section] = value
+        for name, value in units.items():
+            yield kind, name, value
+
+    for key, value in combined.items():
+        if key not in ("preprocessing", *ANALYSIS_KINDS):
+            yield "meta", key, value
+
+
+def write(path: str, combined: dict):
+    """Write a combined result to a fresh store at path, replacing any existing one atomically."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        with conn:
+            conn.execute(SCHEMA)
+            conn.executemany(
+                "INSERT INTO sections (kind, name, value) VALUES (?, ?, ?)",
+                ((kind, name, utils.to_json(value)) for kind, name, value in rows_from_result(combined))
+            )
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def put_rows(path: str, rows):
+    """Add or replace (kind, name, value) rows in the store at path, creating it if needed.
+
+    Used while a run is in progress; write() replaces the store with the complete result at the end.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            conn.execute(SCHEMA)
+            conn.executemany(
+                "INSERT OR REPLACE INTO sections (kind, name, value) VALUES (?, ?, ?)",
+                ((kind, name, utils.to_json(value)) for kind, name, value in rows)
+            )
+    finally:
+        conn.close()
+
+
+def open_store(result_path: str):
+    """Store for a result JSON, building it from the JSON once if only the export exists."""
+    path = store_path(result_path)
+    if not os.path.exists(path):
+        with open(result_path, "r", encoding="utf-8") as f:
+            write(path, json.load(f))
+    return ResultStore(path)
+
+
+class ResultStore:
+    """Read access to one analysis result, one column, pair or preprocessed column at a time.
+
+    Rows are JSON values keyed by (kind, name) with kind one of 'column',
+    'pair', 'preprocessing' or 'meta'. to_dict() rebuilds the combined
+    layout of the JSON export.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def names(self, kind: str):
+        with self.connect() as conn:
+            return [name for (name,) in conn.execute("SELECT name FROM sections WHERE kind = ? ORDER BY rowid", (kind,))]
+
+    def get(self, kind: str, name: str, default=None):
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM sections WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_many(self, kind: str, names, chunk_size: int = 500):
+        names = list(names)
+        values = {}
+        with self.connect() as conn:
+            for i in range(0, len(names), chunk_size):
+                chunk = names[i:i + chunk_size]
+                rows = conn.execute(
+                    f"SELECT name, value FROM sections WHERE kind = ? AND name IN ({','.join('?' * len(chunk))})", (kind, *chunk)
+                )
+                values.update((name, json.loads(value)) for name, value in rows)
+        return {name: values[name] for name in names if name in values}
+
+    def items(self, kind: str):
+        with self.connect() as conn:
+            rows = conn.execute("SELECT name, value FROM sections WHERE kind = ? ORDER BY rowid", (kind,)).fetchall()
+        return {name: json.loads(value) for name, value in rows}
+
+    def column(self, column: str):
+        return self.get("column", column, {})
+
+    def pair(self, col1: str, col2: str):
+        return self.get("pair", f"{col1}-{col2}", {})
+
+    def preprocessing(self, columns=None):
+        """Preprocessing results in the combined layout, for all columns or only the given ones."""
+        values = self.items("preprocessing") if columns is None else self.get_many("preprocessing", columns)
+        return {
+            section: {column: value[section] for column, value in values.items() if section in value}
+            for section in PREPROCESSING_SECTIONS
+        }
+
+    def to_dict(self):
+        combined = {"preprocessing": self.preprocessing()}
+        for analysis, kind in ANALYSIS_KINDS.items():
+            units = self.items(kind)
+            combined[analysis] = {
+                section: {name: value[section] for name, value in units.items() if section in value}
+                for section in SECTIONS
+            }
+        combined.update(self.items("meta"))
+        return combined
+
+    def export_json(self, path: str):
+        utils.dump_json(self.to_dict(), path, indent=2)
+        return path
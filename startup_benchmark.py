@@ -0,0 +1,106 @@
+"""Cold-start import profile of the app's entry modules.
+
+Examples:
+    python startup_benchmark.py --output startup.json
+    python startup_benchmark.py --modules frontend query_agent --compare startup.json
+
+Each module is imported in a fresh interpreter under `python -X importtime`
+with background warm-up disabled, so the numbers are what a container start
+or first page load pays before anything is shown.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+MODULES = ["frontend", "job_queue", "query_agent", "core_agent"]
+
+
+def parse_importtime(stderr):
+    """Top-level packages from -X importtime output as {package: cumulative seconds}."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented by two spaces per level after the separator.
+        if name.startswith("  "):
+            continue
+        packages[name.strip()] = packages.get(name.strip(), 0) + int(cumulative) / 1e6
+    return packages
+
+
+def profile_import(module, top):
+    env = {**os.environ, "WARMUP": "0", "JOB_EMBEDDED_POOL": "0"}
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, env=env)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        return {"error": errors[-1] if errors else f"exit code {proc.returncode}"}
+    packages = parse_importtime(proc.stderr)
+    return {
+        "wall_seconds": round(wall, 4),
+        "import_seconds": round(sum(packages.values()), 4),
+        "slowest": {name: round(seconds, 4) for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+    }
+
+
+def run(module, repeat, top):
+    """Best of repeat runs, so one slow disk read does not dominate."""
+    results = [profile_import(module, top) for _ in range(repeat)]
+    ok = [result for result in results if "error" not in result]
+    return min(ok, key=lambda result: result["wall_seconds"]) if ok else results[-1]
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["modules"]
+
+    print(f"\nComparison against {baseline_path}:")
+    for module, result in report["modules"].items():
+        old = baseline.get(module)
+        if not old or "wall_seconds" not in old or "wall_seconds" not in result:
+            continue
+        print(f"{module}: wall {old['wall_seconds']:.2f}s -> {result['wall_seconds']:.2f}s, "
+              f"imports {old['import_seconds']:.2f}s -> {result['import_seconds']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the app's entry modules.")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top-level packages to report.")
+    parser.add_argument("--output", default="startup_result.json")
+    parser.add_argument("--compare", help="Earlier startup JSON to compare against.")
+    args = parser.parse_args()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "modules": {},
+    }
+    for module in args.modules:
+        result = run(module, args.repeat, args.top)
+        report["modules"][module] = result
+        if "error" in result:
+            print(f"[STARTUP] {module}: failed: {result['error']}")
+            continue
+        print(f"[STARTUP] {module}: {result['wall_seconds']:.2f}s wall, {result['import_seconds']:.2f}s in imports")
+        for name, seconds in result["slowest"].items():
+            print(f"    {name}: {seconds:.3f}s")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[STARTUP] Results written to {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
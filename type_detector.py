@@ -1,4 +1,4 @@
-import google.generativeai as genai
+import llm_client
 import pandas as pd
 import os
 import json
@@ -6,21 +6,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-def detect_datatypes(df):
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY1")
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    column_info = {}
-    for col in df.columns:
-        sample_values = df[col].dropna().head(10).tolist()
-        unique_count = df[col].nunique()
-        total_count = len(df[col].dropna())
-        column_info[col] = {
-            'sample_values': sample_values,
-            'unique_count': unique_count,
-            'total_count': total_count,
-            'dtype': str(df[col].dtype)
+def detect_datatypes(df, profile=None):
+    return resolve_time_series(detect_column_types(df, profile))
+
+
+def describe_column(df, col, profile=None):
+    if profile is not None and col in profile:
+        stats = profile[col]
+        return {
+            'sample_values': stats['sample_values'],
+            'unique_count': stats['distinct'],
+            'total_count': stats['non_null'],
+            'dtype': stats['dtype']
         }
+    observed = df[col].dropna()
+    return {
+        'sample_values': observed.head(10).tolist(),
+        'unique_count': observed.nunique(),
+        'total_count': len(observed),
+        'dtype': str(df[col].dtype)
+    }
+
+
+def detect_column_types(df, profile=None):
+    """Ask the LLM for each column's type, before the dataset-level time series adjustment.
+
+    With a DatasetProfile of the same data, the column facts come from the profile instead of a rescan.
+    """
+    model = llm_client.get_model(llm_client.MODEL_NAME)
+    column_info = {col: describe_column(df, col, profile) for col in df.columns}
 
     prompt = f"""
     Analyze the following CSV column data and classify each column into exactly one of these types:
@@ -45,8 +59,12 @@ def detect_datatypes(df):
         if ':' in line:
             col, dtype = line.split(':', 1)
             result_dict[col.strip()] = dtype.strip()
+    return result_dict
 
 
+def resolve_time_series(column_types):
+    """If any column is a time series, numeric columns are treated as time series values too."""
+    result_dict = dict(column_types)
     if "time series" in result_dict.values():
         for k, v in result_dict.items():
             if v in ["categorical nominal", "categorical ordinal", "binary variable"]:
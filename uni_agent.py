@@ -1,25 +1,31 @@
 import pandas as pd
 import numpy as np
-import json
-import google.generativeai as genai
+import llm_client
 import os
-import matplotlib.pyplot as plt
 from scipy import stats
 
 from kb_statistical import StatisticalKnowledgeBase
 import utils
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY2")
+import llm_schemas
+import instrumentation
+import vis_renderer
+import plot_data
+import plot_templates
+import artifacts
+VISUALIZATION_SELECTION = os.getenv("VISUALIZATION_SELECTION", "llm")
 
 class UnivariateAnalyzer:
-    def __init__(self, knowledge_base: StatisticalKnowledgeBase):
+    def __init__(self, knowledge_base: StatisticalKnowledgeBase, renderer: vis_renderer.VisualizationRenderer = None, artifact_dir: str = artifacts.UPLOAD_DIR):
         self.data = None
         self.var_type = None
         self.knowledge_base = knowledge_base
         self.knowledge = None
+        self.fragments = None
         self.priority_test_data = None
         self.metadata = None
-        genai.configure(api_key=GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+        self.renderer = renderer
+        self.artifact_dir = artifact_dir
+        self.model = llm_client.get_model(llm_client.MODEL_NAME)
 
     def analyze(self, data_column: pd.Series, var_type: str, metadata: str, column_name: str):
         self.data = data_column
@@ -33,26 +39,23 @@ class UnivariateAnalyzer:
         return desc_result, vis_result, inf_result
 
     def fetch_knowledge(self, var_type):
-        doc = self.knowledge_base.search_knowledge("univariate", var_type)
-        if doc == "No relevant statistical test found.":
+        self.var_type = var_type
+        self.fragments = self.knowledge_base.fragments("univariate", var_type)
+        if self.fragments is None:
             raise ValueError("No statistical knowledge found for this variable type.")
-        self.knowledge = json.loads(doc)
+        self.knowledge = self.fragments.knowledge
 
+    @instrumentation.traced("uni_descriptive")
     def perform_descriptive_stats(self, data_column, metadata, previous_error = ""):
         try:
-            priority_tests = self.knowledge.get("priority_tests", [])
-            descriptive_stats = self.knowledge.get("descriptive", {}).get("statistics", [])
-            selection_criteria = self.knowledge.get("descriptive", {}).get("selection_criteria", [])
-            application_criteria = self.knowledge.get("descriptive", {}).get("application_criteria", [])
-
             descriptive_prompt = f"""
             You are a statistical Python code generator. Generate Python code to calculate the following using numpy, pandas, scipy, and statsmodels as needed.
 
             Priority Tests:
-            {json.dumps(priority_tests, indent=2)}
+            {self.fragments["priority_tests"]}
 
             Descriptive Statistics:
-            {json.dumps(descriptive_stats, indent=2)}
+            {self.fragments["descriptive_statistics"]}
 
             {f"Previous response error: {previous_error}" if previous_error else ""}
 
@@ -81,22 +84,21 @@ class UnivariateAnalyzer:
             python_code = utils.extract_json_from_response(response.text)
 
             local_vars = {'data_column': data_column}
-            exec(python_code, {}, local_vars)
+            instrumentation.run_code(python_code, {}, local_vars, step="descriptive")
 
             intermediate_result = local_vars.get('result')
-            serializable_result = utils.convert_to_serializable(intermediate_result)
 
             reasoning_prompt = f"""
             You are a statistical reasoning assistant. Based on the following test results, selection criteria, and application criteria, finalize the preferred statistics and summarize key findings.
 
             Test Results:
-            {json.dumps(serializable_result, indent=2)}
+            {utils.to_json(intermediate_result, indent=2)}
 
             Selection Criteria:
-            {json.dumps(selection_criteria, indent=2)}
+            {self.fragments["descriptive_selection"]}
 
             Application Criteria:
-            {json.dumps(application_criteria, indent=2)}
+            {self.fragments["descriptive_application"]}
 
             {f"Previous response error: {previous_error}" if previous_error else ""}
 
@@ -126,10 +128,9 @@ class UnivariateAnalyzer:
             - Do not return any additional text or explanation outside the JSON structure.
             """
 
-            response = self.model.generate_content(reasoning_prompt)
-            json_string = utils.extract_json_from_response(response.text)
-
-            descriptive_result = json.loads(json_string)
+            response = self.model.generate_content(reasoning_prompt, generation_config=llm_schemas.json_config())
+            descriptive_result = llm_schemas.parse(response.text)
+            descriptive_result["computed_results"] = intermediate_result
             return descriptive_result
         
         except Exception as e:
@@ -141,67 +142,64 @@ class UnivariateAnalyzer:
 
 
 
+    @instrumentation.traced("uni_visualization")
     def perform_visualization(self, data_column, desc_results, column_name, previous_error = ""):
         try:
-            prompt = f"""
-            You are a statistical visualization assistant. Based on the statistical knowledge and the provided data list and descriptive statistics, suggest the two most appropriate visualizations.
+            column_plot_data = plot_data.prepare_univariate(data_column, self.var_type)
+            visualization_suggestions = {}
 
-            Visualization Options and Selection Criteria:
-            {json.dumps(self.knowledge.get("visualization", {}), indent=2)}
+            if VISUALIZATION_SELECTION != "rule":
+                templates = plot_templates.available_templates(self.knowledge)
+                prompt = f"""
+                You are a statistical visualization assistant. Based on the statistical knowledge and the provided data list and descriptive statistics, suggest the two most appropriate visualizations.
 
-            Descriptive Statistics Result:
-            {json.dumps(desc_results, indent=2)}
+                Visualization Options and Selection Criteria:
+                {self.fragments["visualization"]}
 
-            Data describe:
-            {data_column.describe()}
+                Descriptive Statistics Result:
+                {utils.to_json(desc_results, indent=2)}
 
-            column_name: {column_name}
+                Data describe:
+                {data_column.describe()}
 
-            {f"Previous response error: {previous_error}" if previous_error else ""}
+                column_name: {column_name}
 
-            Instructions:
-            - Assume 'data_column' is a pandas Series already defined.
-            - Select the two most appropriate visualizations based on the selection criteria and descriptive statistics.
-            - For each visualization, provide:
-                - "name": the name of the selected plot (e.g., 'Histogram', 'Box Plot').
-                - Complete Python code using matplotlib.pyplot.
-                - The code no need to include the definition of the data variable at the beginning and use variable name as data_column in the code.
-                - Don't include any import statement, comments.
-                - The code must save the plot as an image (file name: 'uploads/columnName_vis1.png' and 'uploads/columnName_vis2.png' respectively).
+                {f"Previous response error: {previous_error}" if previous_error else ""}
+
+                Instructions:
+                - Select the two most appropriate visualizations based on the selection criteria and descriptive statistics.
+                - "name" must be exactly one of: {templates}
+                - The plots are drawn by built-in templates, so do not return any code.
                 - "reason": clearly explain why this visualization is the best choice for the provided data using descriptive statistics.
-                - If selecting histogram, use bins size appropriately using range of given data
-                - Deside on size and ranges of graph in the code based on max and min values of give data column
-            - If not possible to get two best visualization, return only one
-            - Return ONLY a JSON dictionary in the following structure:
-                {{
-                    "visualization_1": {{
-                        "name": "name of selected plot",
-                        "python_code": "code_here",
-                        "reason": "reason_here_why you selected that plot"
-                    }},
-                    "visualization_2": {{
-                        "name": "name of selected plot",
-                        "python_code": "code_here",
-                        "reason": "reason_here_why you selected that plot"
+                - If not possible to get two best visualization, return only one
+                - Return ONLY a JSON dictionary in the following structure:
+                    {{
+                        "visualization_1": {{
+                            "name": "name of selected plot",
+                            "reason": "reason_here_why you selected that plot"
+                        }},
+                        "visualization_2": {{
+                            "name": "name of selected plot",
+                            "reason": "reason_here_why you selected that plot"
+                        }}
                     }}
-                }}
-            - Do not return any explanations outside this JSON structure.
-            """
+                - Do not return any explanations outside this JSON structure.
+                """
 
-            response = self.model.generate_content(prompt)
+                response = self.model.generate_content(
+                    prompt, generation_config=llm_schemas.json_config(llm_schemas.VisualizationSelection, {"name": templates})
+                )
+                visualization_suggestions = llm_schemas.parse(response.text, llm_schemas.VisualizationSelection)
 
-            json_string = utils.extract_json_from_response(response.text)
-            visualization_suggestions = json.loads(json_string)
+            visualization_suggestions = plot_templates.resolve_selection(visualization_suggestions, self.knowledge, column_plot_data)
 
-            local_vars = {'plt': plt, 'data_column': data_column}
-
-            if "visualization_1" in visualization_suggestions:
-                exec_code_1 = visualization_suggestions['visualization_1']['python_code']
-                exec(exec_code_1, local_vars)
-
-            if "visualization_2" in visualization_suggestions:
-                exec_code_2 = visualization_suggestions['visualization_2']['python_code']
-                exec(exec_code_2, local_vars)
+            for vis_key, vis_info in visualization_suggestions.items():
+                image_path = artifacts.image_path(self.artifact_dir, column_name, index=vis_key[-1])
+                args = (vis_info["name"], "univariate", column_plot_data, image_path, f"{column_name} - {vis_info['name']}")
+                if self.renderer:
+                    self.renderer.submit(column_name, vis_info, vis_renderer.render_template, *args)
+                else:
+                    vis_info.update(vis_renderer.render_template(*args))
 
             return visualization_suggestions
         except Exception as e:
@@ -212,26 +210,23 @@ class UnivariateAnalyzer:
             }
 
 
+    @instrumentation.traced("uni_inferential")
     def perform_inferential_stats(self, data_column, desc_results, metadata, previous_error = ""):
         try:
-            inferential_tests = self.knowledge.get("inferential", {}).get("tests", [])
-            selection_criteria = self.knowledge.get("inferential", {}).get("selection_criteria", [])
-            application_criteria = self.knowledge.get("inferential", {}).get("application_criteria", [])
-
             inferential_prompt = f"""
             You are a statistical inference expert. Perform the following task carefully:
 
             Available Inferential Tests:
-            {json.dumps(inferential_tests, indent=2)}
+            {self.fragments["inferential_tests"]}
 
             Selection Criteria:
-            {json.dumps(selection_criteria, indent=2)}
+            {self.fragments["inferential_selection"]}
 
             Application Criteria:
-            {json.dumps(application_criteria, indent=2)}
+            {self.fragments["inferential_application"]}
 
             Descriptive Statistics Results:
-            {json.dumps(desc_results, indent=2)}
+            {utils.to_json(desc_results, indent=2)}
 
             {f"Previous response error: {previous_error}" if previous_error else ""}
 
@@ -264,13 +259,12 @@ class UnivariateAnalyzer:
             - Do not return any explanations or text outside this JSON structure.
             """
 
-            response = self.model.generate_content(inferential_prompt)
-            json_string = utils.extract_json_from_response(response.text)
-            inferential_results = json.loads(json_string)
+            response = self.model.generate_content(inferential_prompt, generation_config=llm_schemas.json_config())
+            inferential_results = llm_schemas.parse(response.text)
 
             for test_name, test_details in inferential_results.items():
                 local_vars = {'data_column': data_column}
-                exec(test_details['python_code'], local_vars)
+                instrumentation.run_code(test_details['python_code'], local_vars, step="inferential", test=test_name)
                 result = local_vars.get('result')
 
                 inferential_results[test_name]['result'] = result
@@ -282,7 +276,7 @@ class UnivariateAnalyzer:
             You are a statistical inference reasoning assistant.
 
             Test Selection and results:
-            {json.dumps(inferential_results, indent=2)}
+            {utils.to_json(inferential_results, indent=2)}
 
             {f"Previous response error: {previous_error}" if previous_error else ""}
 
@@ -308,9 +302,8 @@ class UnivariateAnalyzer:
             - Do not return any explanations or text outside this JSON structure.
             """
 
-            conclusion_response = self.model.generate_content(conclusion_prompt)
-            final_json_string = utils.extract_json_from_response(conclusion_response.text)
-            final_inferential_results = json.loads(final_json_string)
+            conclusion_response = self.model.generate_content(conclusion_prompt, generation_config=llm_schemas.json_config())
+            final_inferential_results = llm_schemas.parse(conclusion_response.text)
 
             return final_inferential_results
         
@@ -1,5 +1,17 @@
+import re
+import sys
+import ast
+import json
+import math
+import datetime
+
 import numpy as np
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def extract_json_from_response(response_text):
     if "```json" in response_text:
         return response_text.split("```json")[1].split("```")[0].strip()
@@ -17,14 +29,95 @@ def extract_json_from_response(response_text):
 
     return response_text.strip()
 
-def convert_to_serializable(obj):
+def repair_json(text):
+    """Fix the usual near-misses in LLM JSON: surrounding prose, trailing or missing commas, Python literals."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    end = max(text.rfind("}"), text.rfind("]"))
+    if not starts or end < min(starts):
+        raise ValueError("No JSON object found in response.")
+    text = text[min(starts):end + 1]
+    try:
+        # Raw newlines inside strings (python_code values) are the most common slip.
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+    text = re.sub(r",(\s*[}\]])", r"\1", text)
+    # A value ending one line and a key starting the next, e.g. "preferred"\n  "other": ...
+    text = re.sub(r'(["\d}\]]|true|false|null)(\s*\n\s*")', r"\1,\2", text)
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError) as e:
+        raise ValueError(f"Could not repair JSON response: {e}")
+    if not isinstance(value, (dict, list)):
+        raise ValueError("Response is not a JSON object or array.")
+    return value
+
+def parse_json_response(response_text):
+    """JSON value of an LLM reply; near-valid JSON is repaired locally rather than re-prompted."""
+    cleaned = extract_json_from_response(response_text)
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        return repair_json(cleaned)
+
+def json_default(obj):
+    """default hook for json/orjson: NumPy and pandas values become plain JSON, NaN becomes null."""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in "fc":
+            return np.where(np.isfinite(obj), obj, None).tolist()
+        return obj.tolist()
+    # pandas objects can only exist once pandas is imported; checking sys.modules keeps it out of light callers.
+    pd = sys.modules.get("pandas")
+    if pd is not None:
+        if isinstance(obj, (pd.Series, pd.Index)):
+            return json_default(obj.to_numpy())
+        if isinstance(obj, pd.DataFrame):
+            return {str(col): json_default(obj[col].to_numpy()) for col in obj.columns}
+        if obj is pd.NaT or obj is pd.NA:
+            return None
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def finite_floats(obj):
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
     if isinstance(obj, dict):
-        return {k: convert_to_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_to_serializable(i) for i in obj]
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    else:
-        return obj
\ No newline at end of file
+        return {k: finite_floats(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [finite_floats(v) for v in obj]
+    return obj
+
+
+def to_json(obj, indent=None):
+    """Serialize results without copying them first; uses orjson when it is installed."""
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, default=json_default, option=option).decode()
+        except TypeError:
+            pass
+    try:
+        return json.dumps(obj, default=json_default, indent=indent, allow_nan=False)
+    except ValueError as e:
+        if "Out of range float" not in str(e):
+            raise
+        # Plain float NaN/inf never reach the default hook, so only then copy the tree to null them.
+        return json.dumps(finite_floats(obj), default=json_default, indent=indent, allow_nan=False)
+
+
+def dump_json(obj, path, indent=None):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(to_json(obj, indent=indent))
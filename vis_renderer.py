@@ -0,0 +1,68 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _render(draw, image_path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    error = None
+    try:
+        draw(plt)
+        if not os.path.exists(image_path) and plt.get_fignums():
+            plt.savefig(image_path)
+    except Exception as e:
+        error = str(e)
+    finally:
+        plt.close("all")
+
+    return {
+        "image_path": image_path if os.path.exists(image_path) else None,
+        "render_time": round(time.perf_counter() - start, 4),
+        "render_error": error
+    }
+
+
+def render_template(name, no_of_variable, plot_data, image_path, title=""):
+    """Draw a built-in plot template headlessly to image_path."""
+    import plot_templates
+    return _render(lambda plt: plot_templates.render_template(name, no_of_variable, plot_data, image_path, title), image_path)
+
+
+class VisualizationRenderer:
+    """Renders plots in a pool of headless worker processes.
+
+    Analyzers submit render_template jobs while they iterate
+    over columns and pairs; collect() waits for all of them and writes image
+    paths and timings back into the visualization dictionaries the jobs were
+    submitted with.
+    """
+
+    def __init__(self, max_workers=None):
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self.pending = []
+
+    def submit(self, label, vis_info, render_func, *args):
+        future = self.executor.submit(render_func, *args)
+        self.pending.append((label, vis_info, future))
+
+    def collect(self):
+        timings = {}
+        for label, vis_info, future in self.pending:
+            try:
+                vis_info.update(future.result())
+            except Exception as e:
+                vis_info.update({"image_path": None, "render_time": None, "render_error": str(e)})
+            timings.setdefault(label, []).append(vis_info["render_time"])
+        self.pending = []
+        return timings
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)